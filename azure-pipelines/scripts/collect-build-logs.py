@@ -1,34 +1,77 @@
 #!/usr/bin/python3
 
-import datetime, time, json, os, sys, argparse
-from urllib.request import Request, urlopen
+import datetime, json, os, re, sys, argparse, codecs, hashlib
 from urllib.error import HTTPError
-from copy import deepcopy
+from urllib.parse import quote
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from jsonl_writer import JsonlWriter, JsonString, write_records
+from http_client import HttpClient, get_charset, read_chunks, read_content
 
 TIMESTAMP = datetime.datetime.now()
 TIMESTAMPSTR = TIMESTAMP.isoformat()
 DEFAULT_START_TIMESTAMP = datetime.datetime.now() - datetime.timedelta(days=14)
+# Number of the parallel downloads
+DEFAULT_JOBS = 8
+# Number of the pull requests in a page of the list
+PULLREQUEST_PAGE_SIZE = 300
+# Number of the pushes in a page of the list
+PUSH_PAGE_SIZE = 2000
+EMPTY_OBJECT_ID = "0000000000000000000000000000000000000000"
+# The log content is truncated to the max column size in characters
+MAX_COLUMN_SIZE = 104855000
 
-# Download the web content from the url
+def read_text(response, max_size):
+  # The decoded body of the response, the reading stops after max_size characters
+  decoder = codecs.getincrementaldecoder(get_charset(response))()
+  for chunk in read_chunks(response):
+    text = decoder.decode(chunk)[:max_size]
+    max_size -= len(text)
+    yield text
+    if max_size <= 0:
+      return
+  yield decoder.decode(b'', True)[:max_size]
+
+def read_lines(texts):
+  # Split the texts into lines as str.split('\n') of the joined texts
+  pending = []
+  for text in texts:
+    if '\n' not in text:
+      pending.append(text)
+      continue
+    lines = text.split('\n')
+    lines[0] = ''.join(pending) + lines[0]
+    pending = [lines.pop()]
+    yield from lines
+  yield ''.join(pending)
+
+def read_log(response):
+  # The log is truncated, decoded and filtered line by line while it is read
+  # into a JsonString, which is moved to the disk when it grows, so only a
+  # chunk, a line and at most SPOOL_SIZE of the content are kept in memory
+  content = JsonString()
+  separator = ''
+  for line in read_lines(read_text(response, MAX_COLUMN_SIZE)):
+    if '&sp=' in line and '&sig=' in line:
+      continue
+    content.write(separator)
+    content.write(line)
+    separator = '\n'
+  return content
+
+# Download the web content from the url, read returns the content of the response
 TOKEN = ''
-def get_response(url):
-  for i in range(0, 3):
-    try:
-      req = Request(url)
-      req.add_header('Authorization', TOKEN)
-      req.add_header('Content-Type', 'application/json')
-      response = urlopen(req)
-      data=response.read()
-      encoding = response.info().get_content_charset()
-      return data.decode(encoding)
-    except HTTPError as e:
-      if e.code == 404:
-        print("404 error:", url)
-        return None
-    except Exception as e:
-      print(e)
-      time.sleep(10)
-  raise Exception('failed to get response from {0}'.format(url))
+HTTP_CLIENT = HttpClient({'Content-Type': 'application/json'})
+def get_response(url, read=read_content):
+  try:
+    return HTTP_CLIENT.request(url, read=read)
+  except HTTPError as e:
+    if e.code == 404:
+      print("404 error:", url)
+      return None
+    raise Exception('failed to get response from {0}'.format(url)) from e
 
 def get_timelines(timeline_url, build_info):
   results = []
@@ -56,109 +99,294 @@ def get_timelines(timeline_url, build_info):
       record['uri'] = build_info['uri']
   return records
 
-def get_build_logs(timelines):
-  max_column_size = 104855000
-  results = []
-  for timeline in timelines:
-    record = timeline.copy()
-    if record['log']:
-      log_url = record['log']['url']
-      log = get_response(log_url)
-      content = log[:max_column_size]
-      lines = []
-      for line in content.split('\n'):
-         if '&sp=' in line and '&sig=' in line:
-           continue
-         lines.append(line)
-      record['content'] = '\n'.join(lines)
-    results.append(record)
-  return results
+def get_build_timelines(urlprefix, build_id):
+  url = urlprefix + "/_apis/build/builds/" + build_id + "?api-version=7.0"
+  content = get_response(url)
+  build_info = json.loads(content)
+  timeline_url = build_info['_links']['timeline']['href']
+  return get_timelines(timeline_url, build_info)
+
+def get_log_line_counts(urlprefix, build_id):
+  # The line counts of the build logs by build id and log id
+  url = urlprefix + "/_apis/build/builds/" + build_id + "/logs?api-version=7.0"
+  content = get_response(url)
+  if not content:
+    return {}
+  return {(int(build_id), log['id']): log['lineCount'] for log in json.loads(content)['value']}
+
+def get_log_url(record, line_counts, tail_lines):
+  # With tail_lines only the last lines of the log are downloaded
+  url = record['log']['url']
+  line_count = line_counts.get((record['buildId'], record['log']['id']))
+  if not tail_lines or not line_count:
+    return url
+  separator = '&' if '?' in url else '?'
+  return url + separator + "startLine={0}&endLine={1}".format(max(line_count - tail_lines + 1, 1), line_count)
+
+def is_log_selected(record, results, types, name_pattern):
+  if results and record.get('result') not in results:
+    return False
+  if types and record.get('type') not in types:
+    return False
+  if name_pattern and not name_pattern.search(record.get('name') or ''):
+    return False
+  return True
+
+def get_build_log(timeline, line_counts=None, tail_lines=None):
+  if line_counts is None:
+    line_counts = {}
+  record = timeline.copy()
+  if record['log']:
+    log_url = get_log_url(record, line_counts, tail_lines)
+    content = get_response(log_url, read_log)
+    if content is not None:
+      record['content'] = content
+  return record
+
+def ordered_map(executor, function, items, window):
+  # Like executor.map, but at most window items are downloaded ahead of the
+  # consumer, so the results are streamed in order without keeping them all
+  pending = deque()
+  for item in items:
+    if len(pending) >= window:
+      yield pending.popleft().result()
+    pending.append(executor.submit(function, item))
+  while pending:
+    yield pending.popleft().result()
+
+def get_build_logs(timelines, executor=None, jobs=1, line_counts=None, tail_lines=None):
+  if line_counts is None:
+    line_counts = {}
+  get_log = partial(get_build_log, line_counts=line_counts, tail_lines=tail_lines)
+  if executor is None:
+    return map(get_log, timelines)
+  return ordered_map(executor, get_log, timelines, 2 * jobs)
 
 def write_logs(records, filename):
-  lines = []
-  if not records:
-    return lines
-  for record in records:
-    lines.append(json.dumps(record))
-  if filename == "-":
-    print('\n'.join(lines))
-  elif filename:
-    with open(filename, "w") as file:
-      file.write('\n'.join(lines))
+  # The records are written as they are produced, "-" writes to the stdout
+  if filename:
+    write_records(records, filename)
+
+def get_log_key(record):
+  log_id = record['log']['id'] if record['log'] else None
+  return (record['buildId'], record['id'], log_id)
+
+def get_entry_key(entry):
+  return (entry['buildId'], entry['recordId'], entry['logId'])
+
+def get_entries_end(entries):
+  # The output offset after the last completed log
+  if not entries:
+    return 0
+  return entries[-1]['offset'] + entries[-1]['size']
+
+def load_manifest(filename):
+  # The entries of the completed logs and the manifest size up to the last
+  # complete entry, a partly written entry of a failed run is ignored
+  entries = []
+  size = 0
+  if not os.path.exists(filename):
+    return entries, size
+  with open(filename, 'rb') as file:
+    for line in file:
+      if not line.endswith(b'\n'):
+        break
+      try:
+        entries.append(json.loads(line))
+      except ValueError:
+        break
+      size += len(line)
+  return entries, size
+
+def resume_logs(filename, manifest_filename):
+  # Returns the manifest entries, the output and the manifest are cut after the
+  # last completed log, so the missing logs are appended after it
+  entries, manifest_size = load_manifest(manifest_filename)
+  end = get_entries_end(entries)
+  size = os.path.getsize(filename) if os.path.exists(filename) else 0
+  if not entries and size > 0:
+    # an output without its manifest would be lost by the truncation below
+    raise Exception('{0} exists without logs in the manifest {1}, remove the output or give its manifest'.format(filename, manifest_filename))
+  if os.path.exists(manifest_filename):
+    os.truncate(manifest_filename, manifest_size)
+  if size < end:
+    raise Exception('{0} is shorter than the manifest {1}, check it with --verify-manifest'.format(filename, manifest_filename))
+  if size > end:
+    os.truncate(filename, end)
+  return entries
+
+def write_logs_with_manifest(records, filename, manifest_filename):
+  # Every written record is added to the manifest with its offset, size and hash,
+  # the offsets follow the output cut after the last completed log
+  with JsonlWriter(filename, append=True) as writer, open(manifest_filename, 'a') as manifest:
+    for record in records:
+      digest = hashlib.sha256()
+      size = writer.write(record, digest)
+      writer.flush()
+      build_id, record_id, log_id = get_log_key(record)
+      entry = {
+        'buildId': build_id,
+        'recordId': record_id,
+        'logId': log_id,
+        'offset': writer.size - size,
+        'size': size,
+        'sha256': digest.hexdigest(),
+      }
+      manifest.write(json.dumps(entry) + '\n')
+      manifest.flush()
+
+def verify_manifest(filename, manifest_filename):
+  # Check the logs of the manifest in the output without downloading them,
+  # returns the found errors
+  entries, _ = load_manifest(manifest_filename)
+  if not os.path.exists(filename):
+    return ['{0} does not exist'.format(filename)]
+  errors = []
+  keys = set()
+  end = 0
+  with open(filename, 'rb') as file:
+    for entry in entries:
+      key = get_entry_key(entry)
+      if key in keys:
+        errors.append('{0} is in the manifest twice'.format(key))
+      keys.add(key)
+      file.seek(end)
+      if file.read(entry['offset'] - end) != (b'\n' if end else b''):
+        errors.append('{0} does not follow the previous log'.format(key))
+      content = file.read(entry['size'])
+      if len(content) != entry['size'] or hashlib.sha256(content).hexdigest() != entry['sha256']:
+        errors.append('{0} does not match its size or hash'.format(key))
+      elif get_log_key(json.loads(content)) != key:
+        errors.append('{0} is another record'.format(key))
+      end = entry['offset'] + entry['size']
+    file.seek(0, os.SEEK_END)
+    if file.tell() != end:
+      errors.append('{0} has {1} bytes after the last log'.format(filename, file.tell() - end))
+  return errors
 
 def collect_build_logs(args):
+  # The timelines of the builds and then the logs of the records are downloaded
+  # by the parallel jobs, the output keeps the build and record order
   timelines = []
-  for build_id in args.buildIds.split(','):
-    url = args.urlprefix + "/_apis/build/builds/" + build_id + "?api-version=7.0"
-    content = get_response(url)
-    build_info = json.loads(content)
-    timeline_url = build_info['_links']['timeline']['href']
-    timelines += get_timelines(timeline_url, build_info)
-  if args.collect_build_timelines:
-    write_logs(timelines, args.collect_build_timelines)
-  if args.collect_build_logs:
-    logs = get_build_logs(timelines)
-    write_logs(logs,  args.collect_build_logs)
+  build_ids = args.buildIds.split(',')
+  with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+    for records in executor.map(get_build_timelines, repeat(args.urlprefix), build_ids):
+      timelines += records
+    if args.collect_build_timelines:
+      write_logs(timelines, args.collect_build_timelines)
+    if args.collect_build_logs:
+      # only the logs of the selected records are collected
+      results = args.log_results.split(',') if args.log_results else None
+      types = args.log_types.split(',') if args.log_types else None
+      name_pattern = re.compile(args.log_name_pattern) if args.log_name_pattern else None
+      selected = [timeline for timeline in timelines if is_log_selected(timeline, results, types, name_pattern)]
+      line_counts = {}
+      if args.log_tail_lines:
+        for counts in executor.map(get_log_line_counts, repeat(args.urlprefix), build_ids):
+          line_counts.update(counts)
+      if args.manifest:
+        # a rerun collects only the logs missing in the manifest
+        entries = resume_logs(args.collect_build_logs, args.manifest)
+        completed = {get_entry_key(entry) for entry in entries}
+        selected = [timeline for timeline in selected if get_log_key(timeline) not in completed]
+      logs = get_build_logs(selected, executor, args.jobs, line_counts, args.log_tail_lines)
+      if args.manifest:
+        write_logs_with_manifest(logs, args.collect_build_logs, args.manifest)
+      else:
+        write_logs(logs,  args.collect_build_logs)
+
+def get_paged_values(url, page_size, id_key):
+  # The values of all the pages of a list. The server may return fewer values
+  # than the page size before the end, so the pages are read until one is
+  # empty or has no new value
+  skip = 0
+  ids = set()
+  while True:
+    content = get_response(url + "&$top={0}&$skip={1}".format(page_size, skip))
+    values = json.loads(content)['value']
+    new_count = 0
+    for value in values:
+      # a value added while paging shifts the pages, skip the repeated ones
+      if value[id_key] not in ids:
+        ids.add(value[id_key])
+        new_count += 1
+        yield value
+    if new_count == 0:
+      return
+    skip += len(values)
 
 def get_pullrequests(args):
   from dateutil import parser as dateparser
   start_timestamp = dateparser.parse(args.start_timestamp).replace(tzinfo=None)
   results = []
   url_prefix = args.urlprefix + "/_apis/git/repositories/" + args.repository + "/pullrequests"
-  url = url_prefix + "?api-version=7.0&$top=300"
-  content = get_response(url + "&searchCriteria.status=completed")
-  pullrequest_info = json.loads(content)
-  for pullrequest in pullrequest_info['value']:
+  # the server filters by the time range since api-version 7.1, the dates are checked again below
+  url = url_prefix + "?api-version=7.1&searchCriteria.minTime=" + quote(start_timestamp.isoformat())
+  for pullrequest in get_paged_values(url + "&searchCriteria.status=completed&searchCriteria.queryTimeRangeType=closed", PULLREQUEST_PAGE_SIZE, 'pullRequestId'):
     colsedDate = dateparser.parse(pullrequest['closedDate']).replace(tzinfo=None)
     if colsedDate > start_timestamp:
       results.append(pullrequest) 
-  content = get_response(url + "&searchCriteria.status=active")
-  pullrequest_info = json.loads(content)
-  for pullrequest in pullrequest_info['value']:
+  for pullrequest in get_paged_values(url + "&searchCriteria.status=active&searchCriteria.queryTimeRangeType=created", PULLREQUEST_PAGE_SIZE, 'pullRequestId'):
     creationDate = dateparser.parse(pullrequest['creationDate']).replace(tzinfo=None)
     if creationDate > start_timestamp:     
       results.append(pullrequest)
   return results
 
+def get_pullrequest_commits(url_prefix, pullrequest):
+  commits_url =  url_prefix + '/'  + str(pullrequest['pullRequestId']) + "/commits?api-version=7.0"
+  content = get_response(commits_url)
+  commits_info = json.loads(content)
+  return commits_info['value']
+
 
 def collect_pullrequests(args):
   start_timestamp = args.start_timestamp
   pullrequests = get_pullrequests(args)
   url_prefix = args.urlprefix + "/_apis/git/repositories/" + args.repository + "/pullrequests"
   if not args.not_include_pullrequest_commits:
-    for pullrequest in pullrequests:
-      commits_url =  url_prefix + '/'  + str(pullrequest['pullRequestId']) + "/commits?api-version=7.0"
-      content = get_response(commits_url)
-      commits_info = json.loads(content)
-      pullrequest["commits"] = commits_info['value']
-      pullrequest["dump_timestamp"] = TIMESTAMPSTR
+    # the commits of the pull requests are downloaded by the parallel jobs
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+      all_commits = executor.map(get_pullrequest_commits, repeat(url_prefix), pullrequests)
+      for pullrequest, commits in zip(pullrequests, all_commits):
+        pullrequest["commits"] = commits
+        pullrequest["dump_timestamp"] = TIMESTAMPSTR
   write_logs(pullrequests,  args.collect_pullrequests)
 
+def get_range_commits(url_prefix, object_ids):
+  old_object_id, new_object_id = object_ids
+  commits_url = url_prefix + "/commits?api-version=7.0&searchCriteria.itemVersion.version={0}&searchCriteria.itemVersion.versionType=commit&searchCriteria.compareVersion.version={1}&searchCriteria.compareVersion.versionType=commit".format(old_object_id, new_object_id)
+  commit_content = get_response(commits_url)
+  if not commit_content:
+    return []
+  return json.loads(commit_content)["value"]
+
 def collect_pushes(args):
   from dateutil import parser as dateparser
   if not args.repository:
     raise Exception('The -r or --repository not specified')
   start_timestamp = dateparser.parse(args.start_timestamp).replace(tzinfo=None)
-  results = []
   url_prefix = args.urlprefix + "/_apis/git/repositories/" + args.repository
-  url = url_prefix + "/pushes?api-version=7.0&searchCriteria.includeRefUpdates=true&searchCriteria.fromDate={0}&$top=2000".format(start_timestamp.isoformat())
-  content = get_response(url)
-  push_info = json.loads(content)
-  for push in push_info["value"]:
-    push_id = push['pushId']
-    refUpdates = push['refUpdates']
+  url = url_prefix + "/pushes?api-version=7.0&searchCriteria.includeRefUpdates=true&searchCriteria.fromDate={0}".format(start_timestamp.isoformat())
+  pushes = list(get_paged_values(url, PUSH_PAGE_SIZE, 'pushId'))
+  # the refs updated to the same commits share the range, every range is queried once
+  ranges = {}
+  for push in pushes:
+    for refUpdate in push['refUpdates']:
+      object_ids = (refUpdate["oldObjectId"], refUpdate["newObjectId"])
+      if EMPTY_OBJECT_ID not in object_ids:
+        ranges[object_ids] = None
+  with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+    range_commits = dict(zip(ranges, executor.map(get_range_commits, repeat(url_prefix), ranges)))
+  results = []
+  for push in pushes:
     push["commits"] = []
     push["dump_timestamp"] = TIMESTAMPSTR
-    for refUpdate in refUpdates:
-      tmp_push = deepcopy(push)
-      tmp_push["refUpdate"] = refUpdate
-      if refUpdate["newObjectId"] != "0000000000000000000000000000000000000000" and refUpdate["oldObjectId"] != "0000000000000000000000000000000000000000":
-        commits_url = url_prefix + "/commits?api-version=7.0&searchCriteria.itemVersion.version={0}&searchCriteria.itemVersion.versionType=commit&searchCriteria.compareVersion.version={1}&searchCriteria.compareVersion.versionType=commit".format(refUpdate["oldObjectId"], refUpdate["newObjectId"])
-        commit_content = get_response(commits_url)
-        if commit_content:
-          commit_info = json.loads(commit_content)
-          tmp_push["commits"] = commit_info["value"]
-      results.append(tmp_push)
+    for refUpdate in push['refUpdates']:
+      # the records of the refs share the push content, they are not modified
+      ref_push = dict(push)
+      ref_push["refUpdate"] = refUpdate
+      ref_push["commits"] = range_commits.get((refUpdate["oldObjectId"], refUpdate["newObjectId"]), [])
+      results.append(ref_push)
   write_logs(results, args.collect_pushes)
 
 def get_arguments_old():
@@ -187,15 +415,38 @@ if __name__ == "__main__":
   parser.add_argument("--collect-pushes", help="Collect pushes")
   parser.add_argument("--not-include-pullrequest-commits", help="Not include pullrequest commits, default is false", action="store_true")
   parser.add_argument("--start-timestamp", help="The start timestamp", default=DEFAULT_START_TIMESTAMP.isoformat())
+  parser.add_argument("--log-results", help="Collect only the logs of the records with the results, comma separated, for example, failed,succeededWithIssues")
+  parser.add_argument("--log-types", help="Collect only the logs of the records with the types, comma separated, for example, Task,Job")
+  parser.add_argument("--log-name-pattern", help="Collect only the logs of the records whose name matches the regular expression")
+  parser.add_argument("--log-tail-lines", help="Collect only the last lines of the logs", type=int)
+  parser.add_argument("--manifest", help="Manifest of the collected build logs in an uncompressed file, a rerun collects only the logs missing in the manifest")
+  parser.add_argument("--verify-manifest", help="Verify the collected build logs with the manifest without downloading, default is false", action="store_true")
+  parser.add_argument("-j", "--jobs", help="Number of the parallel downloads, default is {0}".format(DEFAULT_JOBS), type=int, default=DEFAULT_JOBS)
   if len(argv) > 1 and argv[0].startswith('http'): #old command line
     argv = get_arguments_old()
   args = parser.parse_args(argv)
+  if args.manifest and args.collect_build_logs:
+    # the manifest records the byte offsets of the logs in an uncompressed file
+    if args.collect_build_logs == '-':
+      parser.error('--manifest cannot be used with the stdout output of --collect-build-logs')
+    if args.collect_build_logs.endswith('.gz') or args.collect_build_logs.endswith('.zst'):
+      parser.error('--manifest cannot be used with the compressed output {0}'.format(args.collect_build_logs))
   TOKEN = args.token
   if TOKEN and (not(TOKEN.startswith("Bearer") or TOKEN.startswith("Basic"))):
     TOKEN = "Bearer " + TOKEN # If token type not specified, Bearer token used
+  HTTP_CLIENT.headers['Authorization'] = TOKEN
+  if args.verify_manifest:
+    if not args.manifest or not args.collect_build_logs:
+      raise Exception('The --manifest or --collect-build-logs not specified')
+    errors = verify_manifest(args.collect_build_logs, args.manifest)
+    for error in errors:
+      print(error)
+    print('{0} errors found by the manifest {1}'.format(len(errors), args.manifest))
+    sys.exit(1 if errors else 0)
   if args.collect_build_timelines or args.collect_build_logs:
     collect_build_logs(args)
   if args.collect_pullrequests:
     collect_pullrequests(args)
   if args.collect_pushes:
     collect_pushes(args)
+  HTTP_CLIENT.log_metrics()
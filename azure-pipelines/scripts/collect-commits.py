@@ -2,81 +2,287 @@
 
 # Collect the commits info
 
-import datetime, time, json, os, sys, git
+import datetime, time, json, os, subprocess, sys, git
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from dateutil import parser
+from jsonl_writer import write_records
 
 MAX_COMMIT_COUNT_IN_BRANCH=int(os.getenv('MAX_COMMIT_COUNT_IN_BRANCH', 200))
 TIMESTAMP = datetime.datetime.now()
 TIMESTAMPSTR = TIMESTAMP.isoformat()
 DEFAULT_MIN_COMMIT_TIMESTAMP = datetime.datetime.now() - datetime.timedelta(days=180)
 MIN_COMMIT_TIMESTAMP =parser.parse(os.getenv('MIN_COMMIT_TIMESTAMP', DEFAULT_MIN_COMMIT_TIMESTAMP.isoformat())).replace(tzinfo=None)
+# The git log fields of a commit, every commit starts with a NUL and its fields
+# are NUL separated, the diff of the commit follows the last field
+LOG_FIELDS = ['%H', '%an', '%ae', '%ad', '%cn', '%ce', '%cd', '%T', '%B']
+LOG_FORMAT = '%x00' + '%x00'.join(LOG_FIELDS) + '%x00'
+READ_CHUNK_SIZE = 1 << 16
+# Optional file keeping the extracted commits between the runs
+COMMIT_CACHE_FILE = os.getenv('COMMIT_CACHE_FILE')
+COMMIT_CACHE_VERSION = 1
+# Optional file with the last collected commit of every branch, only the commits
+# after it are collected by the next run
+COMMIT_STATE_FILE = os.getenv('COMMIT_STATE_FILE')
+COMMIT_STATE_VERSION = 1
+# Number of the git processes listing the branches and extracting the commits,
+# at least one
+COLLECT_COMMITS_JOBS = max(1, int(os.getenv('COLLECT_COMMITS_JOBS', os.cpu_count() or 1)))
+
+def read_fields(stream):
+  buffer = b''
+  while True:
+    chunk = stream.read(READ_CHUNK_SIZE)
+    if not chunk:
+      break
+    fields = (buffer + chunk).split(b'\0')
+    buffer = fields.pop()
+    for field in fields:
+      yield field
+  yield buffer
+
+def parse_datetime(rawDate):
+  # The raw git date is "<unix timestamp> <+|-hhmm>"
+  timestamp, offset = rawDate.split(' ')
+  seconds = int(offset[1:3]) * 3600 + int(offset[3:5]) * 60
+  if offset[0] == '-':
+    seconds = -seconds
+  tz = datetime.timezone(datetime.timedelta(seconds=seconds))
+  return datetime.datetime.fromtimestamp(int(timestamp), tz)
+
+def parse_files(diff):
+  # Same as the GitPython commit.stats.files: the --raw lines give the change
+  # types and the --numstat lines the counts, binary files count as 0 lines
+  rawLines = []
+  numstatLines = []
+  for line in diff.split('\n'):
+    if line.startswith(':'):
+      rawLines.append(line)
+    elif line:
+      numstatLines.append(line)
+  files = {}
+  for fileInfo, line in zip(rawLines, numstatLines):
+    changeType = fileInfo.split('\t')[0][-1]
+    insertions, deletions, filename = line.split('\t')
+    insertions = insertions != '-' and int(insertions) or 0
+    deletions = deletions != '-' and int(deletions) or 0
+    files[filename] = {
+      'insertions': insertions,
+      'deletions': deletions,
+      'lines': insertions + deletions,
+      'change_type': changeType,
+    }
+  return files
+
+def list_commits(repoPath, branch, maxCount):
+  # Same commits and order as GitPython repo.iter_commits(branch, max_count=maxCount),
+  # with the raw commit dates to filter the time window before the extraction
+  cmd = ['git', '-C', repoPath, 'log', '--no-show-signature', '--date=raw',
+         '--format=%H %cd', '--max-count=%d' % maxCount, branch, '--']
+  commits = []
+  for line in subprocess.check_output(cmd).decode().splitlines():
+    hexsha, committedDate = line.split(' ', 1)
+    commits.append((hexsha, committedDate))
+  return commits
+
+def list_new_commits(repoPath, branch, watermark):
+  # The commits reachable from the branch but not from the watermark, or None if
+  # the watermark is not an ancestor of the branch any more, e.g. after a force push
+  cmd = ['git', '-C', repoPath, 'merge-base', '--is-ancestor', watermark, branch]
+  if subprocess.call(cmd, stderr=subprocess.DEVNULL) != 0:
+    return None
+  cmd = ['git', '-C', repoPath, 'rev-list', branch, '^' + watermark, '--']
+  return set(subprocess.check_output(cmd).decode().split())
+
+def list_branch(repoPath, branch, maxCount, watermark):
+  commits = list_commits(repoPath, branch, maxCount)
+  newHexshas = None
+  if watermark:
+    newHexshas = list_new_commits(repoPath, branch, watermark)
+  return commits, newHexshas
+
+def in_time_window(committedDate):
+  # The commit time in the committer timezone is compared as in GitPython
+  return parse_datetime(committedDate).replace(tzinfo=None) >= MIN_COMMIT_TIMESTAMP
+
+def get_tag_commits(repoPath):
+  # The tag names by the tagged commit from one for-each-ref,
+  # the annotated tags are peeled to their commit
+  cmd = ['git', '-C', repoPath, 'for-each-ref', '--sort=refname',
+         '--format=%(objecttype) %(objectname) %(*objecttype) %(*objectname) %(refname:strip=2)',
+         'refs/tags']
+  tag_commits = {}
+  for line in subprocess.check_output(cmd).decode('utf-8', 'replace').splitlines():
+    objectType, objectName, peeledType, peeledName, tagName = line.split(' ', 4)
+    if objectType == 'commit':
+      hexsha = objectName
+    elif peeledType == 'commit':
+      hexsha = peeledName
+    elif peeledType == 'tag':
+      # a tag of a tag
+      hexsha = subprocess.check_output(['git', '-C', repoPath, 'rev-parse', objectName + '^{commit}']).decode().strip()
+    else:
+      continue
+    tag_commits.setdefault(hexsha, []).append(tagName)
+  return tag_commits
+
+def load_json_file(filename, version, key):
+  # The key of a versioned JSON file, empty if there is no file or another version
+  if not filename or not os.path.exists(filename):
+    return {}
+  with open(filename, "r") as file:
+    content = json.load(file)
+  if content.get('version') != version:
+    return {}
+  return content[key]
+
+def save_json_file(filename, version, key, value):
+  tmpFilename = filename + '.tmp'
+  with open(tmpFilename, "w") as file:
+    json.dump({'version': version, key: value}, file)
+  os.replace(tmpFilename, filename)
+
+def iter_commits(repoPath, hexshas):
+  # One git log streams the commits with their stats against the first parent,
+  # as GitPython would compute them with one git diff per commit
+  cmd = ['git', '-C', repoPath, 'log', '--no-use-mailmap', '--no-show-signature',
+         '--no-renames', '--raw', '--numstat', '--diff-merges=first-parent',
+         '--date=raw', '--format=' + LOG_FORMAT, '--no-walk=unsorted', '--stdin']
+  process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+  # git reads all the revisions before the output starts
+  process.stdin.write(''.join(hexsha + '\n' for hexsha in hexshas).encode())
+  process.stdin.close()
+  fields = read_fields(process.stdout)
+  # skip the empty field before the first commit
+  next(fields)
+  for hexsha in fields:
+    values = [hexsha] + [next(fields) for _ in LOG_FIELDS]
+    (hexsha, authorName, authorEmail, authoredDate, committerName, committerEmail,
+     committedDate, treeHexsha, message, diff) = [value.decode('utf-8', 'replace') for value in values]
+    yield {
+      'hexsha': hexsha,
+      'author': {'name':authorName, 'email':authorEmail},
+      'authored_date': authoredDate,
+      'committer': {'name':committerName, 'email': committerEmail},
+      'committed_date': committedDate,
+      'message': message,
+      'files': parse_files(diff),
+      'tree_hexsha': treeHexsha,
+    }
+  process.stdout.close()
+  if process.wait() != 0:
+    raise subprocess.CalledProcessError(process.returncode, cmd)
+
+def extract_commits(repoPath, hexshas):
+  return list(iter_commits(repoPath, hexshas))
 
 def collect_commit(commit, tagNames):
   result = {
-    'hexsha': commit.hexsha,
-    'author': {'name':commit.author.name, 'email':commit.author.email},
-    'authored_datetime': commit.authored_datetime.isoformat(),
-    'committer': {'name':commit.committer.name, 'email': commit.committer.email},
-    'committed_datetime': commit.committed_datetime.isoformat(),
-    'message': commit.message,
-    'summary': commit.summary,
-    'files': commit.stats.files,
+    'hexsha': commit['hexsha'],
+    'author': commit['author'],
+    'authored_datetime': parse_datetime(commit['authored_date']).isoformat(),
+    'committer': commit['committer'],
+    'committed_datetime': parse_datetime(commit['committed_date']).isoformat(),
+    'message': commit['message'],
+    'summary': commit['message'].split('\n', 1)[0],
+    'files': commit['files'],
     'dump_timestamp': TIMESTAMPSTR,
-    'tree_hexsha': commit.tree.hexsha,
+    'tree_hexsha': commit['tree_hexsha'],
   }
   return result
 
-def collect_commits(repoPath, branches):
+def collect_commits(repoPath, branches, commitCache, jobs=1, watermarks=None):
+  # The commits shared by the branches are extracted once into commitCache,
+  # the branches are listed and the missing commits extracted by the parallel jobs.
+  # With the watermarks, the last collected commits by branch, only the newer
+  # commits are collected and the watermarks are moved to the branch tips
+  if watermarks is None:
+    watermarks = {}
   repo = git.Repo(repoPath)
-  results = []
-  tag_commits = {}
   repo_url = repo.remotes.origin.url
   repo_name = repo_url.split('.git')[0].split('/')[-1]
-  for tag in repo.tags:
-    tagNames = [tag.name]
-    if tag.commit.hexsha in tag_commits:
-      tag_commits[tag.commit.hexsha] += tagNames
-    else:
-      tag_commits[tag.commit.hexsha] = tagNames
-  for branch in branches:
-    commits = list(repo.iter_commits(branch, max_count=MAX_COMMIT_COUNT_IN_BRANCH))
+  tag_commits = get_tag_commits(repoPath)
+  executor = None
+  jobMap = map
+  if jobs > 1:
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    jobMap = executor.map
+  try:
+    branchCommits = list(jobMap(list_branch, repeat(repoPath), branches, repeat(MAX_COMMIT_COUNT_IN_BRANCH),
+                                [watermarks.get(branch) for branch in branches]))
+    listedHexshas = set()
+    missing = []
+    for commits, newHexshas in branchCommits:
+      for hexsha, committedDate in commits:
+        if hexsha in listedHexshas:
+          continue
+        listedHexshas.add(hexsha)
+        if hexsha not in commitCache and in_time_window(committedDate) and (newHexshas is None or hexsha in newHexshas):
+          missing.append(hexsha)
+    chunks = [missing[i::jobs] for i in range(jobs) if missing[i::jobs]]
+    for commits in jobMap(extract_commits, repeat(repoPath), chunks):
+      for commit in commits:
+        commitCache[commit['hexsha']] = commit
+  finally:
+    if executor:
+      executor.shutdown()
+  # the results are merged in the order of the branches and their commits
+  reports = []
+  for branch, (commits, newHexshas) in zip(branches, branchCommits):
     branchName = branch
     if branchName.startswith("origin/"):
       branchName = branch[7:]
-    for commit in commits:
-      if commit.committed_datetime.replace(tzinfo=None) < MIN_COMMIT_TIMESTAMP:
+    collectedCount = 0
+    skippedCount = 0
+    for hexsha, committedDate in commits:
+      if not in_time_window(committedDate):
+        continue
+      if newHexshas is not None and hexsha not in newHexshas:
+        skippedCount += 1
         continue
-      tagNames = tag_commits.get(commit.hexsha, [])
+      collectedCount += 1
+      commit = commitCache[hexsha]
+      tagNames = tag_commits.get(commit['hexsha'], [])
       format_commit = collect_commit(commit, tagNames)
       format_commit['branch'] = branchName
       format_commit['tags'] = tagNames
       format_commit['repo_name'] = repo_name
       format_commit['repo_url'] = repo_url
-      results.append(format_commit)
-  return results
-
-def records_tostring(records):
-  lines = []
-  if not records:
-    return lines
-  for record in records:
-    lines.append(json.dumps(record))
-  return '\n'.join(lines)
-  with open(filename, "w") as file:
-    file.write('\n'.join(lines))
+      yield format_commit
+    if branch in watermarks and newHexshas is None:
+      reports.append('{0}: {1} commits collected, the last collected commit {2} is not in the branch, collected the time window'.format(branch, collectedCount, watermarks[branch]))
+    else:
+      reports.append('{0}: {1} commits collected, {2} skipped as collected before'.format(branch, collectedCount, skippedCount))
+    if commits:
+      watermarks[branch] = commits[0][0]
+  if COMMIT_STATE_FILE:
+    print('\n'.join(reports), file=sys.stderr)
+  # drop the commits no branch lists any more, so the cache does not grow forever
+  for hexsha in set(commitCache) - listedHexshas:
+    del commitCache[hexsha]
 
 def main():
   argv = sys.argv[1:]
   repoPath = argv[0]
   branches = argv[1].split(',')
-  commits = collect_commits(repoPath, branches)
-  commits_str = records_tostring(commits)
+  commitCache = load_json_file(COMMIT_CACHE_FILE, COMMIT_CACHE_VERSION, 'commits')
+  watermarks = load_json_file(COMMIT_STATE_FILE, COMMIT_STATE_VERSION, 'branches')
+  commits = collect_commits(repoPath, branches, commitCache, COLLECT_COMMITS_JOBS, watermarks)
+  filename = '-'
   if len(argv) >= 3:
     filename = argv[2]
-    with open(filename, "w") as file:
-      file.write(commits_str)
-  else:
-    print(commits_str)
+  count = write_records(commits, filename)
+  if COMMIT_STATE_FILE:
+    if count == 0:
+      # the output of the previous run is replaced, so its commits are not read again
+      print('No new commits collected, {0} is written empty'.format(filename), file=sys.stderr)
+    else:
+      print('{0} commits written to {1}'.format(count, filename), file=sys.stderr)
+  if COMMIT_CACHE_FILE:
+    save_json_file(COMMIT_CACHE_FILE, COMMIT_CACHE_VERSION, 'commits', commitCache)
+  # the state moves only after the records are written
+  if COMMIT_STATE_FILE:
+    save_json_file(COMMIT_STATE_FILE, COMMIT_STATE_VERSION, 'branches', watermarks)
 
 if __name__ == "__main__":
   main()
@@ -0,0 +1,218 @@
+# Resilient HTTP client shared by the azure-pipelines scripts
+
+import base64, datetime, http.client, os, random, sys, threading, time, zlib
+from email.utils import parsedate_to_datetime
+from urllib.error import HTTPError
+from urllib.parse import unquote, urlsplit, urljoin
+from urllib.request import getproxies, proxy_bypass
+
+MAX_REDIRECTS = 10
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+# The status codes retried, besides the responses with a Retry-After header
+RETRY_CODES = (408, 429, 500, 502, 503, 504)
+READ_CHUNK_SIZE = 1 << 16
+DEFAULT_TIMEOUT = 300
+# Number of the requests sent to a host at the same time
+MAX_CONNECTIONS_PER_HOST = int(os.getenv('HTTP_MAX_CONNECTIONS_PER_HOST', 8))
+
+def read_chunks(response):
+  # The decompressed body of the response chunk by chunk, a chunk is at most
+  # READ_CHUNK_SIZE however well the body is compressed
+  decompressor = None
+  if response.getheader('Content-Encoding') == 'gzip':
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+  while True:
+    chunk = response.read(READ_CHUNK_SIZE)
+    if not chunk:
+      break
+    if not decompressor:
+      yield chunk
+      continue
+    while chunk:
+      yield decompressor.decompress(chunk, READ_CHUNK_SIZE)
+      chunk = decompressor.unconsumed_tail
+  if decompressor:
+    yield decompressor.flush()
+
+def get_proxy(scheme, netloc):
+  # The proxy of the HTTP_PROXY and HTTPS_PROXY settings as the urlopen uses it,
+  # None if not set or bypassed by NO_PROXY
+  proxy = getproxies().get(scheme)
+  if not proxy or proxy_bypass(netloc.rsplit(':', 1)[0]):
+    return None
+  if '://' not in proxy:
+    proxy = 'http://' + proxy
+  return urlsplit(proxy)
+
+def get_proxy_headers(proxy):
+  if proxy.username is None:
+    return {}
+  credentials = '{0}:{1}'.format(unquote(proxy.username), unquote(proxy.password or ''))
+  return {'Proxy-Authorization': 'Basic ' + base64.b64encode(credentials.encode()).decode()}
+
+def get_charset(response):
+  return response.msg.get_content_charset() or 'utf-8'
+
+def read_content(response):
+  return b''.join(read_chunks(response)).decode(get_charset(response))
+
+def get_retry_after(headers):
+  # The seconds to wait from the Retry-After header, or until the rate limit
+  # reset of GitHub if no request is left, None if not set
+  if not headers:
+    return None
+  value = headers.get('Retry-After')
+  if not value:
+    if headers.get('X-RateLimit-Remaining') == '0' and headers.get('X-RateLimit-Reset'):
+      try:
+        return max(float(headers['X-RateLimit-Reset']) - time.time(), 0)
+      except ValueError:
+        return None
+    return None
+  try:
+    return max(float(value), 0)
+  except ValueError:
+    pass
+  try:
+    retry_at = parsedate_to_datetime(value)
+  except (TypeError, ValueError):
+    return None
+  return max((retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0)
+
+class HttpClient:
+  '''
+  Send the requests over keep-alive connections, one per thread and host, and
+  accept gzip compressed responses, through the proxy of the HTTP_PROXY and
+  HTTPS_PROXY settings. The connection errors and the transient status codes
+  are retried with an exponential backoff and jitter, or after the Retry-After
+  delay or the rate limit reset of the server. At most max_connections requests are sent to
+  a host at the same time, the requests, retries and time are counted by host.
+  '''
+  def __init__(self, headers=None, attempts=3, backoff=1.0, max_backoff=60,
+               timeout=DEFAULT_TIMEOUT, max_connections=MAX_CONNECTIONS_PER_HOST):
+    self.headers = dict(headers or {})
+    self.headers['Accept-Encoding'] = 'gzip'
+    self.attempts = attempts
+    self.backoff = backoff
+    self.max_backoff = max_backoff
+    self.timeout = timeout
+    self.max_connections = max_connections
+    self.local = threading.local()
+    self.lock = threading.Lock()
+    self.semaphores = {}
+    self.metrics = {}
+
+  def get_connection(self, scheme, netloc):
+    connections = getattr(self.local, 'connections', None)
+    if connections is None:
+      connections = self.local.connections = {}
+    connection = connections.get((scheme, netloc))
+    if connection is None:
+      proxy = get_proxy(scheme, netloc)
+      host = proxy.netloc.rsplit('@', 1)[-1] if proxy else netloc
+      if scheme == 'https':
+        connection = http.client.HTTPSConnection(host, timeout=self.timeout)
+        if proxy:
+          # the https requests are tunneled through the proxy
+          connection.set_tunnel(netloc, headers=get_proxy_headers(proxy))
+      else:
+        connection = http.client.HTTPConnection(host, timeout=self.timeout)
+      # the http requests are sent to the proxy with the absolute url
+      connection.proxy_headers = get_proxy_headers(proxy) if proxy and scheme != 'https' else None
+      connections[(scheme, netloc)] = connection
+    return connection
+
+  def close_connection(self, scheme, netloc):
+    connection = getattr(self.local, 'connections', {}).pop((scheme, netloc), None)
+    if connection:
+      connection.close()
+
+  def open(self, url, method, body, headers):
+    # Returns the response with its body not read yet, the redirects of GET are followed
+    for i in range(0, MAX_REDIRECTS + 1):
+      parts = urlsplit(url)
+      path = parts.path or '/'
+      if parts.query:
+        path += '?' + parts.query
+      connection = self.get_connection(parts.scheme, parts.netloc)
+      request_headers = headers
+      if connection.proxy_headers is not None:
+        path = url
+        request_headers = dict(headers, **connection.proxy_headers)
+      try:
+        connection.request(method, path, body=body, headers=request_headers)
+        response = connection.getresponse()
+      except Exception:
+        # the server may have closed the idle connection, the next try reconnects
+        self.close_connection(parts.scheme, parts.netloc)
+        raise
+      response.connection_key = (parts.scheme, parts.netloc)
+      location = response.getheader('Location')
+      if method == 'GET' and response.status in REDIRECT_CODES and location:
+        response.read()
+        self.release(response)
+        url = urljoin(url, location)
+        continue
+      return response
+    raise Exception('too many redirects from {0}'.format(url))
+
+  def release(self, response):
+    # The connection is reused only if the whole response was read
+    if response.will_close or not response.isclosed():
+      self.close_connection(*response.connection_key)
+
+  def get_semaphore(self, netloc):
+    with self.lock:
+      semaphore = self.semaphores.get(netloc)
+      if semaphore is None:
+        semaphore = self.semaphores[netloc] = threading.BoundedSemaphore(self.max_connections)
+      return semaphore
+
+  def get_retry_delay(self, attempt, headers=None):
+    retry_after = get_retry_after(headers)
+    if retry_after is not None:
+      return retry_after
+    return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+  def count(self, netloc, seconds, retried):
+    with self.lock:
+      metrics = self.metrics.setdefault(netloc, {'requests': 0, 'retries': 0, 'seconds': 0.0})
+      metrics['requests'] += 1
+      metrics['retries'] += retried
+      metrics['seconds'] += seconds
+
+  def request(self, url, method='GET', body=None, headers=None, read=read_content):
+    # Returns what read returns from the response, a failed status raises HTTPError
+    netloc = urlsplit(url).netloc
+    headers = dict(self.headers, **(headers or {}))
+    with self.get_semaphore(netloc):
+      for attempt in range(0, self.attempts):
+        start = time.monotonic()
+        try:
+          response = self.open(url, method, body, headers)
+          try:
+            if response.status >= 400:
+              raise HTTPError(url, response.status, response.reason, response.msg, None)
+            return read(response)
+          finally:
+            self.release(response)
+        except HTTPError as e:
+          retried = e.code in RETRY_CODES or get_retry_after(e.headers) is not None
+          if not retried or attempt + 1 == self.attempts:
+            raise
+          delay = self.get_retry_delay(attempt, e.headers)
+          error = e
+        except Exception as e:
+          if attempt + 1 == self.attempts:
+            raise Exception('failed to get response from {0}'.format(url)) from e
+          delay = self.get_retry_delay(attempt)
+          error = e
+        finally:
+          self.count(netloc, time.monotonic() - start, attempt > 0)
+        print('Retry {0} in {1:.1f}s after: {2}'.format(url, delay, error), file=sys.stderr)
+        time.sleep(delay)
+
+  def log_metrics(self, file=sys.stderr):
+    for netloc, metrics in sorted(self.metrics.items()):
+      print('{0}: {1} requests, {2} retries, {3:.1f}s'.format(
+        netloc, metrics['requests'], metrics['retries'], metrics['seconds']), file=file)
@@ -0,0 +1,152 @@
+# Streaming JSON lines writer shared by the collect scripts
+
+import gzip, json, os, sys, tempfile, uuid
+
+# Characters of a JsonString kept in memory before it is moved to the disk
+SPOOL_SIZE = 1 << 20
+COPY_CHUNK_SIZE = 1 << 16
+
+class JsonString:
+  '''
+  A string value built piece by piece as its JSON text in a spooled temporary
+  file, in memory up to max_size characters and on the disk after that.
+  JsonlWriter copies it to the output in chunks, so it is never loaded whole.
+  '''
+  def __init__(self, max_size=SPOOL_SIZE):
+    self.file = tempfile.SpooledTemporaryFile(max_size=max_size, mode='w+', encoding='ascii')
+
+  def write(self, text):
+    # json.dumps escapes every character on its own, so the escaped pieces
+    # join to the escaped string, the JSON text is ASCII
+    self.file.write(json.dumps(text)[1:-1])
+
+  def chunks(self):
+    yield '"'
+    self.file.seek(0)
+    while True:
+      chunk = self.file.read(COPY_CHUNK_SIZE)
+      if not chunk:
+        break
+      yield chunk
+    yield '"'
+
+  def close(self):
+    self.file.close()
+
+def iter_json(value):
+  # The JSON text of the value in pieces, the JsonString values are copied from
+  # their files instead of being encoded in one string
+  strings = []
+  marker = uuid.uuid4().hex
+  def replace(item):
+    if not isinstance(item, JsonString):
+      raise TypeError('Object of type {0} is not JSON serializable'.format(type(item).__name__))
+    strings.append(item)
+    return marker
+  text = json.dumps(value, default=replace)
+  parts = text.split('"{0}"'.format(marker)) if strings else [text]
+  yield parts[0]
+  for string, part in zip(strings, parts[1:]):
+    yield from string.chunks()
+    yield part
+
+class JsonlWriter:
+  '''
+  Write the records one JSON per line as they are produced, so only one record
+  is kept in memory, and its JsonString values are copied in chunks. The file is compressed with gzip or zstd if its name ends
+  with .gz or .zst, written to a temporary file and renamed when complete, so
+  a run without records leaves an empty file. "-" writes to the stdout, where
+  nothing is written if there are no records.
+  With append the records are added to the end of an uncompressed file, which
+  is kept as written if the writing fails.
+  '''
+  def __init__(self, filename, append=False):
+    self.filename = filename
+    self.tmpFilename = filename + '.tmp'
+    self.append = append
+    self.file = None
+    self.count = 0
+    # the size of the output, the JSON text is ASCII as the other characters are escaped
+    self.size = 0
+
+  def open(self):
+    if self.filename == '-':
+      return sys.stdout
+    if self.append:
+      if self.filename.endswith('.gz') or self.filename.endswith('.zst'):
+        raise Exception('Cannot append to the compressed {0}'.format(self.filename))
+      return open(self.filename, 'a', encoding='utf-8', newline='')
+    if self.filename.endswith('.gz'):
+      return gzip.open(self.tmpFilename, 'wt', encoding='utf-8')
+    if self.filename.endswith('.zst'):
+      try:
+        import zstandard
+      except ImportError:
+        raise Exception('The zstandard package is required to write {0}'.format(self.filename))
+      return zstandard.open(self.tmpFilename, 'wt', encoding='utf-8')
+    return open(self.tmpFilename, 'w')
+
+  def write(self, record, digest=None):
+    # Returns the size of the record written after the newline of the previous
+    # record, the digest is updated with the record
+    separator = '\n'
+    if self.file is None:
+      if self.append and os.path.exists(self.filename):
+        self.size = os.path.getsize(self.filename)
+      if self.size == 0:
+        separator = ''
+      self.file = self.open()
+    self.file.write(separator)
+    size = 0
+    for piece in iter_json(record):
+      self.file.write(piece)
+      if digest:
+        digest.update(piece.encode('ascii'))
+      size += len(piece)
+    self.size += len(separator) + size
+    self.count += 1
+    return size
+
+  def flush(self):
+    if self.file is not None:
+      self.file.flush()
+
+  def close(self):
+    if self.file is None:
+      if self.filename == '-' or self.append:
+        return
+      # the output of an earlier run is replaced even if there are no records
+      self.file = self.open()
+    if self.filename == '-':
+      self.file.write('\n')
+      self.file.flush()
+    elif self.append:
+      self.file.close()
+    else:
+      self.file.close()
+      os.replace(self.tmpFilename, self.filename)
+    self.file = None
+
+  def discard(self):
+    if self.file is None or self.filename == '-':
+      return
+    self.file.close()
+    if not self.append:
+      os.remove(self.tmpFilename)
+    self.file = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, excType, excValue, traceback):
+    if excType is None:
+      self.close()
+    else:
+      self.discard()
+
+def write_records(records, filename):
+  # Returns the number of the written records
+  with JsonlWriter(filename) as writer:
+    for record in records:
+      writer.write(record)
+  return writer.count
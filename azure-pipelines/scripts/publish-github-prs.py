@@ -1,9 +1,8 @@
-import datetime, base64, json, time, os, re, pytz, math, sys
-from urllib import request
-from urllib.error import HTTPError
-from http.client import IncompleteRead
+import datetime, base64, json, os, re, pytz, math, sys
 from dateutil import parser
 import http.client
+from urllib.error import HTTPError
+from http_client import HttpClient
 
 from azure.kusto.data import DataFormat
 from azure.kusto.ingest import QueuedIngestClient, IngestionProperties, FileDescriptor, ReportLevel, ReportMethod
@@ -17,6 +16,7 @@ ingest_kcsb = KustoConnectionStringBuilder.with_az_cli_authentication(ingest_clu
 ingest_client = QueuedIngestClient(ingest_kcsb)
 
 url="https://api.github.com/graphql"
+github_client = HttpClient({'Content-Type': 'application/json', 'Authorization': "Bearer {0}".format(GITHUB_TOKEN)}, attempts=10)
 timestamp = datetime.datetime.now(datetime.UTC)
 timeoffset = datetime.timedelta(minutes=5)
 until = (timestamp - timeoffset).replace(tzinfo=pytz.UTC)
@@ -109,24 +109,15 @@ def get_pullrequests():
         while True: # pagination, support 1000 total, support 100 per page
             print("Query: index:%s, count:%s, start:%s, end:%s, page:%s" % (index, count, start.isoformat(), end.isoformat(), condition), flush=True)
             query = query_pattern %(start.isoformat(), end.isoformat(), condition)
-            req = request.Request(url, method="POST")
-            req.add_header('Content-Type', 'application/json')
-            req.add_header('Authorization', "Bearer {0}".format(GITHUB_TOKEN))
             body = {}
             body['query'] = query
             data = bytes(json.dumps(body), encoding="utf-8")
             content = {}
-            for i in range(10):
-                try:
-                    r = request.urlopen(req, data=data)
-                    content = json.loads(r.read())
-                    break
-                except HTTPError as e:
-                    print('Try count: {0}, error code: {1}, reason: {2}'.format(i, e.code, e.reason))
-                    time.sleep(3)
-                except IncompleteRead as e:
-                    print("IncompleteRead", e)
-                    time.sleep(3)
+            try:
+                content = json.loads(github_client.request(url, 'POST', data))
+            except HTTPError as e:
+                # the other errors fail the step, so the start timestamp is not moved
+                print('Query failed, error code: {0}, reason: {1}'.format(e.code, e.reason))
             if 'data' not in content:
                 print(content)
                 break
@@ -146,6 +137,7 @@ def get_pullrequests():
     return results
 
 results = get_pullrequests()
+github_client.log_metrics()
 kusto_ingest(database='build', table='PullRequests', mapping='PullRequests-json', lines=results)
 new_timestamp = update_start_timestamp()
 print(f"New timestamp: {new_timestamp}")
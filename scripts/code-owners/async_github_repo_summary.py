@@ -1,23 +1,40 @@
 import warnings
 import random
-from collections import Counter
+from collections import Counter, defaultdict
 from datetime import datetime, timezone, timedelta
 import logging
 import aiohttp
 import asyncio
+import json
 import os
 import ssl
+import time
 import certifi
-from typing import Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Set
 from urllib.parse import quote_plus
 
 from aiohttp import ClientResponse
 
 from async_helpers import (
     get_all_commit_stats,
+    get_head_commit,
     GitCommitLocal,
+    is_ancestor_commit,
 )
+from blame import get_blame_commit_stats
+from checkpoint import (
+    load_checkpoint,
+    load_state,
+    remove_checkpoint,
+    save_checkpoint,
+    save_state,
+)
+from concurrency import AdaptiveLimiter, process_pool_context
 from contributor import Contributor, ContributorCollection
+from folder_index import FOLDER_INDEX
+from folder_matrix import FolderMatrix
+from folder_stats import roll_up_sharded
 from folders import FolderType, FolderSettings
 from organization import (
     ORGANIZATION,
@@ -36,20 +53,44 @@ class AsyncGitHubRepoSummary:
     patterns.
 
     Attributes:
-        MAX_CONCURRENT_API_REQUESTS: Maximum number of concurrent API
-        requests. MAX_UNRESOLVED_COMMITS: Maximum number of commits to queue
+        MAX_CONCURRENT_API_REQUESTS: Upper bound of the adaptive number of
+        concurrent API requests.
+        INITIAL_CONCURRENT_API_REQUESTS: Starting number of concurrent API
+        requests.
+        MAX_UNRESOLVED_COMMITS: Maximum number of commits to queue
         for resolution.
-        COMMIT_RESOLVE_WORKERS: Number of worker tasks for commit resolution.
+        COMMIT_RESOLVE_WORKERS: Upper bound of the adaptive number of active
+        worker tasks for commit resolution.
+        INITIAL_COMMIT_RESOLVE_WORKERS: Starting number of active workers.
         GITHUB_API_ENDPOINT: Base URL for GitHub API.
+        GITHUB_GRAPHQL_ENDPOINT: URL of the GitHub GraphQL API.
+        WARM_UP_PAGE_SIZE: Number of users per bulk listing page and per
+        profile query of the cache warm-up.
         GITHUB_API_TOKENS_ENV_VAR: Environment variable name for GitHub tokens.
         GITHUB_API_TOKENS: List of GitHub API tokens for authentication.
+        GITHUB_NOREPLY_DOMAIN: The domain of the GitHub noreply emails.
+        ENGINES: The names of the supported ownership statistics engines.
     """
 
     MAX_CONCURRENT_API_REQUESTS = 1000
+    INITIAL_CONCURRENT_API_REQUESTS = 16
     MAX_UNRESOLVED_COMMITS = 1000
     COMMIT_RESOLVE_WORKERS = 64
+    INITIAL_COMMIT_RESOLVE_WORKERS = 4
+    # keep the in-flight requests within this share of the remaining quota
+    RATE_LIMIT_QUOTA_SHARE = 4
+    # numstat counts the changed lines of the whole history,
+    # blame counts the surviving lines at HEAD
+    ENGINES = ("numstat", "blame")
 
     GITHUB_API_ENDPOINT = "https://api.github.com/"
+    GITHUB_GRAPHQL_ENDPOINT = "https://api.github.com/graphql"
+    # users per page of the bulk listings and per GraphQL profile query
+    WARM_UP_PAGE_SIZE = 100
+    # Minimal number of the contributor folder changes to roll up in the
+    # worker processes, smaller repositories are rolled up in place
+    ROLL_UP_SHARDED_MIN_CHANGES = 100000
+    GITHUB_NOREPLY_DOMAIN = "users.noreply.github.com"
     GITHUB_API_TOKENS_ENV_VAR = "GITHUB_API_TOKENS"
     GITHUB_API_TOKENS = [
         token
@@ -97,6 +138,8 @@ class AsyncGitHubRepoSummary:
 
         if response.status == 429:
             logger.warning("Got 429 error, too many requests")
+        await self.api_limiter.decrease(f"HTTP {response.status}")
+        await self.worker_limiter.decrease(f"API HTTP {response.status}")
         if response.headers.get("retry-after"):
             sleep_duration = self.expo_wait_time + int(
                 response.headers["retry-after"]
@@ -126,47 +169,81 @@ class AsyncGitHubRepoSummary:
         await asyncio.sleep(sleep_duration)
 
     async def send_github_api_request(
-        self, url: str, params: Dict[str, str] = None
+        self,
+        url: str,
+        params: Dict[str, str] = None,
+        json_body: Optional[Dict[str, Any]] = None,
     ) -> Optional[Any]:
         """Send a request to the GitHub API with rate limiting and retry logic.
 
         Args:
             url: The GitHub API URL to request.
             params: Optional query parameters for the request.
+            json_body: Optional JSON body, sent with POST instead of GET.
 
         Returns:
             Optional[Any]: JSON response from the API, or None if failed.
 
         Raises:
             ValueError: If the API returns a non-200 status code.
+            RuntimeError: If called in the offline mode.
         """
+        if self.offline:
+            raise RuntimeError(f"GitHub API request {url} in offline mode")
         # limit the number of requests
         headers = self.build_api_headers()
-        async with aiohttp.ClientSession(
-            connector=aiohttp.TCPConnector(ssl=self.ssl_context)
-        ) as session:
-            response = None
-            async with self.github_api_sem:
-                while True:
-                    if response is not None:
-                        # We came back where after 403 error
-                        # check if we need to wait for
-                        # the API cooldown
-                        await self.check_api_rate(response)
-                    async with session.get(
-                        url=url,
-                        headers=headers,
-                        params=params,
-                    ) as response:
-                        if response.status == 403 or response.status == 429:
-                            continue
-                        if response.status != 200:
-                            raise ValueError(
-                                f"Bad API response: {response} "
-                                f"for {url} {params}"
-                            )
-                        self.expo_wait_time = 1
-                        return await response.json()
+        response = None
+        async with self.api_limiter:
+            while True:
+                if response is not None:
+                    # We came back where after 403 error
+                    # check if we need to wait for
+                    # the API cooldown
+                    await self.check_api_rate(response)
+                request_start_time = time.monotonic()
+                async with self.session.request(
+                    "GET" if json_body is None else "POST",
+                    url=url,
+                    headers=headers,
+                    params=params,
+                    json=json_body,
+                ) as response:
+                    if response.status == 403 or response.status == 429:
+                        continue
+                    if response.status != 200:
+                        raise ValueError(
+                            f"Bad API response: {response} "
+                            f"for {url} {params}"
+                        )
+                    self.expo_wait_time = 1
+                    result = await response.json()
+                await self.update_api_concurrency(
+                    response, time.monotonic() - request_start_time
+                )
+                return result
+
+    async def update_api_concurrency(
+        self, response: ClientResponse, latency: float
+    ):
+        """Adjust the API concurrency after a successful request.
+
+        Feeds the request latency into the API limiter and keeps the
+        number of in-flight requests below the remaining rate-limit quota,
+        so the workers slow down before GitHub starts rejecting them.
+
+        Args:
+            response: The successful HTTP response from GitHub API.
+            latency: The duration of the request in seconds.
+        """
+        await self.api_limiter.record_latency(latency)
+        try:
+            remaining = int(response.headers["x-ratelimit-remaining"])
+        except (KeyError, ValueError):
+            return
+        await self.api_limiter.cap(
+            remaining // self.RATE_LIMIT_QUOTA_SHARE,
+            f"rate limit quota {remaining} remaining",
+        )
 
     async def github_id_lookup(self, github_id: int) -> Dict[str, Any]:
         """Look up GitHub user information by user ID.
@@ -187,9 +264,11 @@ class AsyncGitHubRepoSummary:
                 "company": None,
             }
         try:
-            return self.gh_id_lookup_cache[github_id]
+            result = self.gh_id_lookup_cache[github_id]
+            self.profile_cache_hits += 1
+            return result
         except KeyError:
-            pass
+            self.profile_cache_misses += 1
         response = await self.send_github_api_request(
             f"{AsyncGitHubRepoSummary.GITHUB_API_ENDPOINT}"
             f"user/{int(github_id)}",
@@ -210,9 +289,11 @@ class AsyncGitHubRepoSummary:
                 login, id, name, email, company.
         """
         try:
-            return self.gh_login_lookup_cache[github_login]
+            result = self.gh_login_lookup_cache[github_login]
+            self.profile_cache_hits += 1
+            return result
         except KeyError:
-            pass
+            self.profile_cache_misses += 1
         response = await self.send_github_api_request(
             f"{AsyncGitHubRepoSummary.GITHUB_API_ENDPOINT}"
             f"users/{quote_plus(github_login)}",
@@ -222,6 +303,135 @@ class AsyncGitHubRepoSummary:
         }
         return result
 
+    async def list_github_users(self, path: str) -> List[Dict[str, Any]]:
+        """List the users of a paginated GitHub endpoint.
+
+        Args:
+            path: The API path relative to GITHUB_API_ENDPOINT, e.g.
+                "repos/{owner}/{repo}/contributors".
+
+        Returns:
+            List[Dict[str, Any]]: The users with keys login, id, node_id.
+
+        Raises:
+            ValueError: If the API returns a non-200 status code.
+        """
+        users = []
+        page = 1
+        while True:
+            self.warm_up_requests += 1
+            response = await self.send_github_api_request(
+                f"{AsyncGitHubRepoSummary.GITHUB_API_ENDPOINT}{path}",
+                params={
+                    "per_page": str(AsyncGitHubRepoSummary.WARM_UP_PAGE_SIZE),
+                    "page": str(page),
+                },
+            )
+            users.extend(
+                user for user in response if user.get("type") == "User"
+            )
+            if len(response) < AsyncGitHubRepoSummary.WARM_UP_PAGE_SIZE:
+                return users
+            page += 1
+
+    async def github_profiles_lookup(self, node_ids: List[str]) -> int:
+        """Load the user profiles into the lookup caches with one query.
+
+        Args:
+            node_ids: GraphQL node ids of up to WARM_UP_PAGE_SIZE users.
+
+        Returns:
+            int: The number of the loaded profiles.
+
+        Raises:
+            ValueError: If the API returns a non-200 status code.
+        """
+        self.warm_up_requests += 1
+        response = await self.send_github_api_request(
+            AsyncGitHubRepoSummary.GITHUB_GRAPHQL_ENDPOINT,
+            json_body={
+                "query": (
+                    "query($ids: [ID!]!) { nodes(ids: $ids) { ... on User "
+                    "{ login databaseId name email company } } }"
+                ),
+                "variables": {"ids": node_ids},
+            },
+        )
+        loaded = 0
+        for node in (response.get("data") or {}).get("nodes") or []:
+            if not node or node.get("databaseId") is None:
+                continue
+            # Same fields as the REST user, GraphQL returns "" for no email
+            profile = {
+                "login": node["login"],
+                "id": node["databaseId"],
+                "name": node["name"],
+                "email": node["email"] or None,
+                "company": node["company"],
+            }
+            self.gh_id_lookup_cache[profile["id"]] = profile
+            self.gh_login_lookup_cache[profile["login"]] = profile
+            loaded += 1
+        return loaded
+
+    async def warm_up_caches(self):
+        """Pre-load the lookup caches with the likely commit authors.
+
+        Lists the repository contributors and the organization members in
+        pages of WARM_UP_PAGE_SIZE and loads the profiles of the users not
+        cached yet with GraphQL queries of WARM_UP_PAGE_SIZE users each, so
+        the resolver workers rarely need a per-user request. The GraphQL
+        API requires a token, so nothing is loaded without the tokens.
+        """
+        if self.offline or self.owner is None:
+            return
+        if not self.GITHUB_API_TOKENS:
+            logger.info("Skipping the cache warm-up without GitHub tokens")
+            return
+        sources = [
+            source
+            for source in (
+                f"repos/{self.owner}/{self.repo}/contributors",
+                f"orgs/{self.owner}/members",
+            )
+            if source not in self.warmed_up_sources
+        ]
+        self.warmed_up_sources.update(sources)
+        self.warm_up_requests = 0
+        start_time = time.monotonic()
+        listings = await asyncio.gather(
+            *(self.list_github_users(source) for source in sources),
+            return_exceptions=True,
+        )
+        node_ids = dict()
+        for source, users in zip(sources, listings):
+            if isinstance(users, Exception):
+                # e.g. the owner is a user and not an organization
+                logger.info(f"Skipping the warm-up from {source}: {users}")
+                continue
+            for user in users:
+                if user["id"] not in self.gh_id_lookup_cache:
+                    node_ids[user["id"]] = user["node_id"]
+        node_ids = list(node_ids.values())
+        page_size = AsyncGitHubRepoSummary.WARM_UP_PAGE_SIZE
+        loaded = 0
+        for result in await asyncio.gather(
+            *(
+                self.github_profiles_lookup(node_ids[i : i + page_size])
+                for i in range(0, len(node_ids), page_size)
+            ),
+            return_exceptions=True,
+        ):
+            if isinstance(result, Exception):
+                logger.warning(f"Cache warm-up profile query failed: {result}")
+            else:
+                loaded += result
+        logger.info(
+            f"Cache warm-up from {', '.join(sources) or 'no new sources'}: "
+            f"{loaded} profiles loaded with {self.warm_up_requests} "
+            f"requests in {time.monotonic() - start_time:.1f}s"
+        )
+
     async def github_commit_author_id_lookup(self, commit_hash: str) -> int:
         """Look up the GitHub user ID of a commit's author.
 
@@ -246,18 +456,109 @@ class AsyncGitHubRepoSummary:
         except TypeError:
             return -1
 
-    def __init__(self):
+    def __init__(
+        self,
+        api_concurrency: Optional[int] = None,
+        resolve_workers: Optional[int] = None,
+        checkpoint_file: Optional[str] = None,
+        checkpoint_interval: float = 300,
+        resume: bool = False,
+        offline: bool = False,
+        log_dump: Optional[str] = None,
+        shared: Optional["AsyncGitHubRepoSummary"] = None,
+        state_file: Optional[str] = None,
+        warm_up: bool = True,
+        engine: str = "numstat",
+        blame_cache_file: Optional[str] = None,
+        blame_workers: Optional[int] = None,
+        rollup_workers: Optional[int] = None,
+        check_incremental: bool = False,
+    ):
         """Initialize the AsyncGitHubRepoSummary instance.
 
         Sets up caches, SSL context, and rate limiting parameters.
+
+        Args:
+            api_concurrency: Fixed number of concurrent API requests,
+                adaptive if None.
+            resolve_workers: Fixed number of active commit resolution
+                workers, adaptive if None.
+            checkpoint_file: Path to the file with the pipeline state,
+                no checkpoints are written if None.
+            checkpoint_interval: Minimal number of seconds between
+                the checkpoints.
+            resume: Continue from the pipeline state in checkpoint_file.
+            offline: Never call GitHub, resolve the unknown emails with the
+                local heuristics only.
+            log_dump: Path to a recorded git log dump to replay instead of
+                running git log.
+            shared: The summarizer to share the HTTP session, the API
+                concurrency limiter and the lookup caches with when several
+                repositories are processed together.
+            state_file: Path to the file with the ownership state of the
+                previous run. If set, only the commits after the previous
+                run are processed and only the changed folders are
+                recomputed.
+            warm_up: Load the profiles of the repository contributors and
+                the organization members into the lookup caches in bulk
+                before resolving the commits.
+            engine: The ownership statistics engine, one of ENGINES.
+            blame_cache_file: Path to the cache of the blamed files for the
+                blame engine, not cached if None.
+            blame_workers: The number of git blame processes, the number of
+                CPUs if None.
+            rollup_workers: The number of processes rolling up the folder
+                statistics of a full run, the number of CPUs if None, in
+                place if 1.
+            check_incremental: Recompute the folder statistics and owners
+                of an incremental run from scratch and fail if they differ.
         """
-        self.gh_login_lookup_cache = dict()
-        self.gh_id_lookup_cache = dict()
+        self.shared = shared
+        if shared is None:
+            self.gh_login_lookup_cache = dict()
+            self.gh_id_lookup_cache = dict()
+            # Contributors being built, by email
+            self.pending_contributors = dict()
+            # Bulk user listings already loaded into the caches
+            self.warmed_up_sources = set()
+            # Offline lookup indexes of the known contributors
+            self.by_login = dict()
+            self.by_name = dict()
+        else:
+            self.gh_login_lookup_cache = shared.gh_login_lookup_cache
+            self.gh_id_lookup_cache = shared.gh_id_lookup_cache
+            self.pending_contributors = shared.pending_contributors
+            self.warmed_up_sources = shared.warmed_up_sources
+            self.by_login = shared.by_login
+            self.by_name = shared.by_name
+
+        self.api_concurrency = api_concurrency
+        self.resolve_workers = resolve_workers
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_interval = checkpoint_interval
+        self.resume = resume
+        self.offline = offline
+        self.log_dump = log_dump
+        self.state_file = state_file
+        self.warm_up = warm_up
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine {engine}")
+        self.engine = engine
+        self.blame_cache_file = blame_cache_file
+        self.blame_workers = blame_workers
+        self.blame_pool = None
+        self.rollup_workers = rollup_workers
+        self.check_incremental = check_incremental
+        if offline and resolve_workers is None:
+            # Offline resolution never waits for I/O
+            self.resolve_workers = 1
 
         self.ssl_context = None
-        self.github_api_sem = None
+        self.api_limiter = None
+        self.worker_limiter = None
         self.to_resolve_commit_queue = None
         self.connector = None
+        self.session = None
         self.resolved_commit_queue = None
 
         # API wait params if hitting a rate limit
@@ -265,7 +566,7 @@ class AsyncGitHubRepoSummary:
         self.expo_wait_last_update = datetime.now(timezone.utc).timestamp()
         self.expo_wait_time_incr_wait = 10  # after 10 s double the wait rime
 
-        if not self.GITHUB_API_TOKENS:
+        if not self.GITHUB_API_TOKENS and not offline and shared is None:
             warnings.warn(
                 "No GitHub tokens passed in "
                 f"{self.GITHUB_API_TOKENS_ENV_VAR} env var. "
@@ -274,6 +575,75 @@ class AsyncGitHubRepoSummary:
                 "rate-limits-for-the-rest-api?apiVersion=2022-11-28"
             )
 
+    @staticmethod
+    def build_limiter(
+        name: str, override: Optional[int], initial: int, maximum: int
+    ) -> AdaptiveLimiter:
+        """Build an adaptive limiter or a fixed one for the CLI override.
+
+        Args:
+            name: The name of the limiter used in the log messages.
+            override: The fixed limit requested by the user, or None.
+            initial: The starting limit of the adaptive limiter.
+            maximum: The upper bound of the adaptive limiter.
+
+        Returns:
+            AdaptiveLimiter: The configured limiter.
+        """
+        if override is not None:
+            logger.info(f"Concurrency {name}: fixed at {override}")
+            return AdaptiveLimiter(name, override, fixed=True)
+        return AdaptiveLimiter(name, initial, maximum=maximum)
+
+    async def initialize_api(self):
+        """Create the HTTP session and the API concurrency limiter once.
+
+        The session keeps the connections to GitHub alive between the
+        requests and is closed by close().
+        """
+        if self.api_limiter is not None:
+            return
+        self.api_limiter = self.build_limiter(
+            "API requests",
+            self.api_concurrency,
+            AsyncGitHubRepoSummary.INITIAL_CONCURRENT_API_REQUESTS,
+            AsyncGitHubRepoSummary.MAX_CONCURRENT_API_REQUESTS,
+        )
+        if not self.offline:
+            self.ssl_context = ssl.create_default_context(
+                cafile=certifi.where()
+            )
+            self.connector = aiohttp.TCPConnector(
+                ssl=self.ssl_context,
+                limit=AsyncGitHubRepoSummary.MAX_CONCURRENT_API_REQUESTS,
+            )
+            self.session = aiohttp.ClientSession(connector=self.connector)
+
+    def get_blame_pool(self) -> ProcessPoolExecutor:
+        """Get the git blame process pool shared with the summarizers.
+
+        Returns:
+            ProcessPoolExecutor: The pool, created on the first call.
+        """
+        api_owner = self.shared or self
+        if api_owner.blame_pool is None:
+            api_owner.blame_pool = ProcessPoolExecutor(
+                max_workers=self.blame_workers,
+                mp_context=process_pool_context(),
+            )
+        return api_owner.blame_pool
+
+    async def close(self):
+        """Close the HTTP session and the blame pool unless they are shared."""
+        if self.shared is not None:
+            return
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.blame_pool is not None:
+            self.blame_pool.shutdown()
+            self.blame_pool = None
+
     async def _initialize(
         self,
         contributors: ContributorCollection,
@@ -302,17 +672,50 @@ class AsyncGitHubRepoSummary:
             folder: Counter() for folder in repo_folders
         }
         # Perform async operations here
-        self.ssl_context = ssl.create_default_context(cafile=certifi.where())
-        self.github_api_sem = asyncio.Semaphore(
-            AsyncGitHubRepoSummary.MAX_CONCURRENT_API_REQUESTS
+        api_owner = self.shared or self
+        await api_owner.initialize_api()
+        self.api_limiter = api_owner.api_limiter
+        self.session = api_owner.session
+        if self.offline:
+            for contributor in contributors.contributors:
+                self.index_contributor(contributor)
+        self.worker_limiter = self.build_limiter(
+            "resolve workers",
+            self.resolve_workers,
+            AsyncGitHubRepoSummary.INITIAL_COMMIT_RESOLVE_WORKERS,
+            AsyncGitHubRepoSummary.COMMIT_RESOLVE_WORKERS,
         )
-        self.connector = aiohttp.TCPConnector(ssl=self.ssl_context)
         self.repo_path = repo_path
         self.owner = owner
         self.repo = repo
         self.active_after = active_after
         self.max_owners = max_owners
 
+        self.resolve_cache_hits = 0
+        self.profile_cache_hits = 0
+        self.profile_cache_misses = 0
+        self.warm_up_requests = 0
+        # Commits of this repository by contributor
+        self.repo_commits = defaultdict(list)
+        # git log position of each commit read, -1 for the restored ones
+        self.commit_seq = dict()
+        # resolved commits after the fully processed prefix of git log
+        self.resolved_seqs = set()
+        self.processed_prefix = 0
+        self.processed_count = 0
+        self.last_checkpoint_time = time.monotonic()
+
+        # The last commit of the previous run, None for a full run
+        self.base_commit = None
+        self.previous_state = None
+        # Changes of the whole history by GitHub id and folder id
+        self.contributor_changes = defaultdict(Counter)
+        self.contributor_last_ts = dict()
+        # Contributor statistics rolled up to the folders by folder id
+        self.folder_id_stats = defaultdict(Counter)
+        # Paths of the folders whose subtree changed, None if all did
+        self.dirty_folders = None
+        self.previous_ownership = dict()
         self.resolved_commit_queue = asyncio.Queue()
         self.to_resolve_commit_queue = asyncio.Queue(
             maxsize=AsyncGitHubRepoSummary.MAX_UNRESOLVED_COMMITS
@@ -362,120 +765,722 @@ class AsyncGitHubRepoSummary:
             active_after,
             max_owners,
         )
-        cnt = 0
+        settings = self.build_settings(preset_folders)
+        self.ignored_folder_ids = {
+            FOLDER_INDEX.intern(folder)
+            for folder, folder_settings in preset_folders.items()
+            if folder_settings.folder_type == FolderType.IGNORE
+        }
+        # Unless the owners are already defined, count the statistics
+        self.counted_folder_ids = {
+            FOLDER_INDEX.intern(folder)
+            for folder, folder_settings in self.repo_folders.items()
+            if folder_settings.folder_type != FolderType.CLOSED_OWNERS
+        }
+        head_commit = await get_head_commit(repo_path)
+        if self.state_file:
+            await self.restore_state(head_commit, settings)
+        if self.resume:
+            await self.restore_checkpoint(head_commit)
+        if self.warm_up:
+            await self.warm_up_caches()
+        if self.engine == "blame":
+            commits = get_blame_commit_stats(
+                repo_path,
+                head_commit,
+                self.ignored_folder_ids,
+                self.get_blame_pool(),
+                self.blame_cache_file,
+                self.processed_prefix,
+            )
+        else:
+            revision = head_commit
+            if self.base_commit is not None:
+                revision = f"{self.base_commit}..{head_commit}"
+            commits = get_all_commit_stats(
+                repo_path, revision, self.processed_prefix, self.log_dump
+            )
+        seq = self.processed_prefix
+        # Spawn the upper bound of workers,
+        # the worker limiter decides how many of them are active
         backlog_workers = [
             asyncio.create_task(self.resolve_commit())
-            for _ in range(AsyncGitHubRepoSummary.COMMIT_RESOLVE_WORKERS)
+            for _ in range(self.worker_limiter.maximum)
         ]
-        async for commit in get_all_commit_stats(repo_path):
-            while not self.resolved_commit_queue.empty():
-                _, _ = await self.resolved_commit_queue.get()
-                self.resolved_commit_queue.task_done()
-                cnt += 1
-                if cnt % 100 == 0:
-                    logger.debug(
-                        f"Processed {cnt} of {total_commit_count} commits"
-                    )
-                if cnt % 1000 == 0:
-                    await self.contributors.save_to_file()
-
+        async for commit in commits:
+            await self.collect_resolved_commits(
+                head_commit, total_commit_count
+            )
+            self.commit_seq[commit.commit_hash] = seq
+            seq += 1
             await self.to_resolve_commit_queue.put(commit)
         # send a sentinel to all workers to stop
-        for _ in range(AsyncGitHubRepoSummary.COMMIT_RESOLVE_WORKERS):
+        for _ in backlog_workers:
             await self.to_resolve_commit_queue.put(None)
         await asyncio.gather(*backlog_workers)
+        logger.info(
+            f"Concurrency decisions: {self.api_limiter}, "
+            f"{self.worker_limiter}"
+        )
+        profile_lookups = self.profile_cache_hits + self.profile_cache_misses
+        if profile_lookups:
+            logger.info(
+                f"GitHub profile lookups: {self.profile_cache_hits} cached, "
+                f"{self.profile_cache_misses} requested, hit rate "
+                f"{100 * self.profile_cache_hits / profile_lookups:.1f}%"
+            )
 
         # Collect the remaining commits
+        await self.collect_resolved_commits(head_commit, total_commit_count)
+        if self.checkpoint_file:
+            await remove_checkpoint(self.checkpoint_file)
+
+        new_changes = self.merge_repo_commits()
+        if self.previous_state is None:
+            await self.roll_up_active_changes()
+            owner_folder_ids = self.counted_folder_ids
+        else:
+            owner_folder_ids = self.update_folder_stats(new_changes)
+        for folder_id in owner_folder_ids:
+            self.repo_folders_stats[FOLDER_INDEX.paths[folder_id]] = Counter(
+                {
+                    self.contributors.by_github_id[github_id]: change_count
+                    for github_id, change_count in self.folder_id_stats[
+                        folder_id
+                    ].items()
+                }
+            )
+
+        # select contributors for each folder
+        for folder_id in sorted(
+            owner_folder_ids, key=FOLDER_INDEX.paths.__getitem__
+        ):
+            folder = FOLDER_INDEX.paths[folder_id]
+            self.select_owners(
+                self.repo_folders[folder], self.repo_folders_stats[folder]
+            )
+        if self.previous_state is not None and self.check_incremental:
+            self.verify_incremental(settings)
+        self.head_commit = head_commit
+        self.settings = settings
+
+    def build_folder_matrix(self) -> FolderMatrix:
+        """Build the sparse matrix of the folder statistics.
+
+        Returns:
+            FolderMatrix: The changes of the active contributors rolled up
+            to every counted folder, as used for the owner selection.
+        """
+        folder_stats = {
+            FOLDER_INDEX.paths[folder_id]: self.folder_id_stats.get(
+                folder_id, {}
+            )
+            for folder_id in self.counted_folder_ids
+        }
+        return FolderMatrix.build(
+            folder_stats,
+            {
+                github_id: self.contributors.by_github_id[
+                    github_id
+                ].github_login
+                for stats in folder_stats.values()
+                for github_id in stats
+            },
+        )
+
+    def select_owners(
+        self, folder_settings: FolderSettings, contributor_stat: Counter
+    ):
+        """Complement the folder owners with the top contributors.
+
+        Args:
+            folder_settings: The settings of the folder to update.
+            contributor_stat: The changes in the folder by contributor.
+        """
+        if folder_settings.folder_type not in [
+            FolderType.OPEN_OWNERS,
+            FolderType.REGULAR,
+        ]:
+            return
+        need_extra_owners = max(
+            0, (self.max_owners - len(folder_settings.owners))
+        )
+        if need_extra_owners > 0 and contributor_stat:
+            # Select all contributors to complement to the self.max_owners
+            # if there is a tie in the number of changes, select all of them.
+            # The ties are ordered by login, not by the Counter insertion
+            # order, so the full and incremental runs select the same owners
+            it_contributors = iter(
+                sorted(
+                    contributor_stat.items(),
+                    key=lambda item: (-item[1], item[0].github_login),
+                )[: self.max_owners]
+            )
+            contributor, previous_contributor_changes = next(it_contributors)
+            folder_settings.owners[contributor.github_login] = (
+                previous_contributor_changes
+            )
+            for contributor, contributor_changes in it_contributors:
+                if (
+                    len(folder_settings.owners) >= self.max_owners
+                    and contributor_changes < previous_contributor_changes
+                ):
+                    # if found enough contributors and the new contributor has less changes, stop
+                    break
+                folder_settings.owners[contributor.github_login] = (
+                    contributor_changes
+                )
+                previous_contributor_changes = contributor_changes
+
+    def verify_incremental(self, settings: Dict[str, Any]):
+        """Compare the incremental update with a full recomputation.
+
+        The changes of the active contributors are rolled up to all counted
+        folders from scratch and the owners are selected again. The
+        contributors are rolled up in the reverse order, so an owner
+        selection depending on the order of the statistics fails the check.
+
+        Args:
+            settings: The settings of this run, with the preset owners.
+
+        Raises:
+            RuntimeError: If the folder statistics or the owners of a
+                folder differ from the full recomputation.
+        """
+        incremental_stats = self.folder_id_stats
+        self.folder_id_stats = defaultdict(Counter)
+        try:
+            for github_id, changes in reversed(
+                list(self.contributor_changes.items())
+            ):
+                if self.is_active(github_id):
+                    self.roll_up_changes(
+                        github_id, changes, self.counted_folder_ids
+                    )
+            full_stats = self.folder_id_stats
+        finally:
+            self.folder_id_stats = incremental_stats
+        mismatches = []
+        for folder_id in sorted(
+            self.counted_folder_ids, key=FOLDER_INDEX.paths.__getitem__
+        ):
+            folder = FOLDER_INDEX.paths[folder_id]
+            stats = full_stats.get(folder_id, Counter())
+            if +incremental_stats.get(folder_id, Counter()) != stats:
+                mismatches.append(f"{folder}: statistics")
+                continue
+            folder_settings = self.repo_folders[folder]
+            if folder_settings.folder_type not in [
+                FolderType.OPEN_OWNERS,
+                FolderType.REGULAR,
+            ]:
+                continue
+            preset = settings["presets"].get(folder)
+            full_settings = FolderSettings(
+                folder_settings.folder_type,
+                dict(preset[1]) if preset else {},
+                [],
+            )
+            self.select_owners(
+                full_settings,
+                Counter(
+                    {
+                        self.contributors.by_github_id[github_id]: count
+                        for github_id, count in stats.items()
+                    }
+                ),
+            )
+            if dict(folder_settings.owners) != full_settings.owners:
+                mismatches.append(f"{folder}: owners")
+        if mismatches:
+            raise RuntimeError(
+                "The incremental run differs from a full run in "
+                + ", ".join(mismatches)
+            )
+        logger.info(
+            f"Checked the incremental run of {len(self.counted_folder_ids)} "
+            "folders against a full run"
+        )
+
+    def is_active(self, github_id: int) -> bool:
+        """Check if a contributor counts towards the folder owners.
+
+        Args:
+            github_id: The GitHub id of the contributor.
+
+        Returns:
+            bool: True if the contributor is available to review and the
+            last commit to the repository was after the cutoff date.
+        """
+        contributor = self.contributors.by_github_id.get(github_id)
+        return (
+            contributor is not None
+            and contributor.available_to_review
+            and self.contributor_last_ts[github_id] >= self.active_after
+        )
+
+    def merge_repo_commits(self) -> Dict[int, Counter]:
+        """Merge the commits of this run into the contributor changes.
+
+        Returns:
+            Dict[int, Counter]: The changes of this run by GitHub id and
+            folder id.
+        """
+        new_changes = dict()
+        for contributor, commits in self.repo_commits.items():
+            github_id = contributor.github_id
+            folder_changes = new_changes[github_id] = Counter()
+            for commit in commits:
+                for folder_id, change_count in zip(
+                    commit.folder_ids, commit.change_counts
+                ):
+                    folder_changes[folder_id] += change_count
+            self.contributor_changes[github_id].update(folder_changes)
+            last_commit_ts = max(commit.ts for commit in commits)
+            if (
+                github_id not in self.contributor_last_ts
+                or self.contributor_last_ts[github_id] < last_commit_ts
+            ):
+                self.contributor_last_ts[github_id] = last_commit_ts
+        return new_changes
+
+    async def roll_up_active_changes(self):
+        """Roll up the changes of the active contributors to all folders.
+
+        The large repositories are sharded by contributor across the worker
+        processes, the result is the same as rolling up in place.
+        """
+        active_changes = [
+            (github_id, changes)
+            for github_id, changes in self.contributor_changes.items()
+            if self.is_active(github_id)
+        ]
+        change_count = sum(len(changes) for _, changes in active_changes)
+        if (
+            self.rollup_workers == 1
+            or change_count
+            < AsyncGitHubRepoSummary.ROLL_UP_SHARDED_MIN_CHANGES
+        ):
+            for github_id, changes in active_changes:
+                self.roll_up_changes(
+                    github_id, changes, self.counted_folder_ids
+                )
+            return
+        folder_stats = await roll_up_sharded(
+            active_changes,
+            FOLDER_INDEX.parents,
+            self.ignored_folder_ids,
+            self.counted_folder_ids,
+            self.rollup_workers,
+        )
+        for folder_id, stats in folder_stats.items():
+            self.folder_id_stats[folder_id] = Counter(stats)
+
+    def roll_up_changes(
+        self,
+        github_id: int,
+        folder_changes: Counter,
+        folder_ids: Set[int],
+        sign: int = 1,
+        updated_folder_ids: Optional[Set[int]] = None,
+    ):
+        """Apply the changes of a contributor to the folders and ancestors.
+
+        Args:
+            github_id: The GitHub id of the contributor.
+            folder_changes: The changes by folder id.
+            folder_ids: The folders whose statistics are updated.
+            sign: 1 to add the changes, -1 to remove them.
+            updated_folder_ids: Collects the updated folders if not None.
+        """
+        for folder_id, change_count in folder_changes.items():
+            # Apply the changes from the folder up
+            for ancestor_id in FOLDER_INDEX.ancestors(folder_id):
+                if ancestor_id in self.ignored_folder_ids:
+                    # do not account for the data in
+                    # the Ignore subfolders
+                    break
+                if ancestor_id in folder_ids:
+                    stats = self.folder_id_stats[ancestor_id]
+                    stats[github_id] += sign * change_count
+                    if stats[github_id] <= 0:
+                        del stats[github_id]
+                    if updated_folder_ids is not None:
+                        updated_folder_ids.add(ancestor_id)
+
+    def update_folder_stats(self, new_changes: Dict[int, Counter]) -> Set[int]:
+        """Update the statistics of the previous run with the new changes.
+
+        Only the new changes of the active contributors and all changes of
+        the contributors who became active or inactive since the previous
+        run are rolled up. The new folders are computed from scratch. The
+        owners of the unchanged folders are restored from the previous run.
+
+        Args:
+            new_changes: The changes of this run by GitHub id and folder id.
+
+        Returns:
+            Set[int]: The ids of the folders whose owners are recomputed.
+        """
+        state = self.previous_state
+        previous_folder_ids = {
+            FOLDER_INDEX.intern(folder) for folder in state["folders"]
+        }
+        new_folder_ids = self.counted_folder_ids - previous_folder_ids
+        kept_folder_ids = self.counted_folder_ids - new_folder_ids
+        for folder, stats in state["folder_stats"].items():
+            folder_id = FOLDER_INDEX.intern(folder)
+            if folder_id in kept_folder_ids:
+                self.folder_id_stats[folder_id] = Counter(
+                    {
+                        int(github_id): change_count
+                        for github_id, change_count in stats.items()
+                    }
+                )
+
+        updated_folder_ids = set(new_folder_ids)
+        for github_id, changes in self.contributor_changes.items():
+            previous = state["contributors"].get(str(github_id))
+            was_active = previous is not None and previous["active"]
+            now_active = self.is_active(github_id)
+            if was_active and now_active:
+                delta, sign = new_changes.get(github_id), 1
+            elif now_active:
+                delta, sign = changes, 1
+            elif was_active:
+                delta, sign = (
+                    changes - new_changes.get(github_id, Counter()),
+                    -1,
+                )
+            else:
+                delta = None
+            if delta:
+                self.roll_up_changes(
+                    github_id, delta, kept_folder_ids, sign, updated_folder_ids
+                )
+            if now_active:
+                self.roll_up_changes(github_id, changes, new_folder_ids)
+
+        # The owners of a renamed contributor are renamed in the output
+        renamed_logins = {
+            previous["login"]
+            for github_id, previous in state["contributors"].items()
+            if int(github_id) in self.contributors.by_github_id
+            and self.contributors.by_github_id[int(github_id)].github_login
+            != previous["login"]
+        }
+        for folder, owners in state["owners"].items():
+            if renamed_logins.intersection(owners):
+                updated_folder_ids.add(FOLDER_INDEX.intern(folder))
+        updated_folder_ids &= self.counted_folder_ids
+
+        for folder_id in self.counted_folder_ids - updated_folder_ids:
+            folder = FOLDER_INDEX.paths[folder_id]
+            self.repo_folders[folder].owners.update(
+                state["owners"].get(folder, {})
+            )
+
+        # The output changes for the folders with the changed owners,
+        # the parents of the added and removed folders and their ancestors
+        changed_folder_ids = set(updated_folder_ids)
+        for folder in self.repo_folders.keys() ^ set(state["folders"]):
+            changed_folder_ids.add(FOLDER_INDEX.intern(folder))
+        self.dirty_folders = set()
+        for folder_id in changed_folder_ids:
+            for ancestor_id in FOLDER_INDEX.ancestors(folder_id):
+                folder = FOLDER_INDEX.paths[ancestor_id]
+                if folder in self.dirty_folders:
+                    break
+                self.dirty_folders.add(folder)
+        self.previous_ownership = state["ownership"]
+        logger.info(
+            f"Recomputing the owners of {len(updated_folder_ids)} and "
+            f"the output of {len(self.dirty_folders)} of "
+            f"{len(self.repo_folders)} folders"
+        )
+        return updated_folder_ids
+
+    def build_settings(
+        self, preset_folders: Dict[str, FolderSettings]
+    ) -> Dict[str, Any]:
+        """Build the settings the stored ownership state depends on.
+
+        Args:
+            preset_folders: Dictionary mapping folder presets
+                            to their settings.
+
+        Returns:
+            Dict[str, Any]: JSON-serializable settings.
+        """
+        return json.loads(
+            json.dumps(
+                {
+                    "max_owners": self.max_owners,
+                    "presets": {
+                        folder: [
+                            folder_settings.folder_type.name,
+                            (
+                                dict(folder_settings.owners)
+                                if isinstance(folder_settings.owners, dict)
+                                else sorted(folder_settings.owners)
+                            ),
+                        ]
+                        for folder, folder_settings in preset_folders.items()
+                    },
+                }
+            )
+        )
+
+    async def restore_state(self, head_commit: str, settings: Dict[str, Any]):
+        """Restore the ownership state of the previous run.
+
+        The state is only used if its last commit is in the history of
+        HEAD and it was computed with the same settings, otherwise the
+        whole history is processed.
+
+        Args:
+            head_commit: The hash of the commit the history starts from.
+            settings: The settings of this run, see build_settings().
+        """
+        state = await load_state(self.state_file)
+        if state is None:
+            logger.info(f"No state {self.state_file}, processing all commits")
+            return
+        if self.log_dump or self.engine == "blame":
+            logger.info(
+                f"Ignoring state {self.state_file} for the replayed git log "
+                "or the blame engine"
+            )
+            return
+        if state["settings"] != settings:
+            logger.info(
+                f"Folder presets or max owners changed since {self.state_file}"
+                ", processing all commits"
+            )
+            return
+        if not await is_ancestor_commit(
+            self.repo_path, state["head_commit"], head_commit
+        ):
+            logger.warning(
+                f"State {self.state_file} commit {state['head_commit']} is "
+                f"not in the history of HEAD {head_commit}, "
+                "processing all commits"
+            )
+            return
+        for github_id, previous in state["contributors"].items():
+            github_id = int(github_id)
+            self.contributor_changes[github_id] = Counter(
+                {
+                    FOLDER_INDEX.intern(folder): change_count
+                    for folder, change_count in previous["changes"].items()
+                }
+            )
+            last_commit_ts = datetime.fromisoformat(previous["last_commit_ts"])
+            self.contributor_last_ts[github_id] = last_commit_ts
+            contributor = self.contributors.by_github_id.get(github_id)
+            if contributor is not None and (
+                contributor.last_commit_ts is None
+                or contributor.last_commit_ts < last_commit_ts
+            ):
+                contributor.last_commit_ts = last_commit_ts
+        self.base_commit = state["head_commit"]
+        self.previous_state = state
+        logger.info(
+            f"Processing the commits after {self.base_commit} "
+            f"from state {self.state_file}"
+        )
+
+    async def write_state(self, ownership: Dict[str, Dict[str, Any]]):
+        """Save the ownership state for the next incremental run.
+
+        Must be called after the contributors are saved, so that every
+        GitHub id referenced by the state is in the contributors file.
+
+        Args:
+            ownership: The folder owners as printed in the output.
+        """
+        await save_state(
+            self.state_file,
+            {
+                "head_commit": self.head_commit,
+                "settings": self.settings,
+                "folders": sorted(self.repo_folders),
+                "contributors": {
+                    github_id: {
+                        "login": getattr(
+                            self.contributors.by_github_id.get(github_id),
+                            "github_login",
+                            None,
+                        ),
+                        "active": self.is_active(github_id),
+                        "last_commit_ts": self.contributor_last_ts[
+                            github_id
+                        ].isoformat(),
+                        "changes": {
+                            FOLDER_INDEX.paths[folder_id]: change_count
+                            for folder_id, change_count in changes.items()
+                        },
+                    }
+                    for github_id, changes in self.contributor_changes.items()
+                },
+                "folder_stats": {
+                    FOLDER_INDEX.paths[folder_id]: stats
+                    for folder_id, stats in self.folder_id_stats.items()
+                    if stats and folder_id in self.counted_folder_ids
+                },
+                "owners": {
+                    folder: folder_settings.owners
+                    for folder, folder_settings in self.repo_folders.items()
+                    if folder_settings.owners
+                },
+                "ownership": ownership,
+            },
+        )
+        logger.info(f"Saved state {self.state_file} at {self.head_commit}")
+
+    async def collect_resolved_commits(
+        self, head_commit: str, total_commit_count: int
+    ):
+        """Account the commits resolved by the workers so far.
+
+        Advances the fully processed prefix of git log, periodically saves
+        the contributors and writes the checkpoint.
+
+        Args:
+            head_commit: The hash of the commit the history starts from.
+            total_commit_count: Total number of commits in the repository.
+        """
         while not self.resolved_commit_queue.empty():
-            _, _ = await self.resolved_commit_queue.get()
+            commit, _ = await self.resolved_commit_queue.get()
             self.resolved_commit_queue.task_done()
-            cnt += 1
+            self.resolved_seqs.add(self.commit_seq[commit.commit_hash])
+            while self.processed_prefix in self.resolved_seqs:
+                self.resolved_seqs.remove(self.processed_prefix)
+                self.processed_prefix += 1
+            self.processed_count += 1
+            cnt = self.processed_count
             if cnt % 100 == 0:
                 logger.debug(
                     f"Processed {cnt} of {total_commit_count} commits"
                 )
             if cnt % 1000 == 0:
                 await self.contributors.save_to_file()
-
-        # process the active contributors
-        for contributor in self.contributors.contributors:
             if (
-                contributor.last_commit_ts is not None
-                and contributor.last_commit_ts >= self.active_after
-                and contributor.available_to_review
+                self.checkpoint_file
+                and time.monotonic() - self.last_checkpoint_time
+                >= self.checkpoint_interval
             ):
-                # if the contributor's last commit was after
-                # the cutoff date, add the commit stats to the
-                # repo folders
-                for commit in contributor.commits:
-                    for folder, change_count in commit.changes.items():
-                        folder = os.sep + folder
-                        # Apply the changes from the folder up
-                        while True:
-                            try:
-                                if (
-                                    preset_folders[folder].folder_type
-                                    == FolderType.IGNORE
-                                ):
-                                    # do not account for the data in
-                                    # the Ignore subfolders
-                                    break
-                            except KeyError:
-                                # Ignore non-existent folders
-                                pass
-                            try:
-                                if (
-                                    self.repo_folders[folder].folder_type
-                                    != FolderType.CLOSED_OWNERS
-                                ):
-                                    # Unless the owners are already defined,
-                                    # count the statistics
-                                    self.repo_folders_stats[folder][
-                                        contributor
-                                    ] += change_count
-                            except KeyError:
-                                # Ignore non-existent folders
-                                pass
-                            if folder == os.sep:
-                                break
-                            folder = os.path.dirname(folder)
+                await self.write_checkpoint(head_commit)
 
-        # select contributors for each folder
-        for folder, contributor_stat in sorted(
-            self.repo_folders_stats.items()
-        ):
-            folder_settings = self.repo_folders[folder]
-            if folder_settings.folder_type in [
-                FolderType.OPEN_OWNERS,
-                FolderType.REGULAR,
-            ]:
-                need_extra_owners = max(
-                    0, (self.max_owners - len(folder_settings.owners))
+    async def write_checkpoint(self, head_commit: str):
+        """Save the state of the fully processed prefix of git log.
+
+        The contributors are saved first, so that every GitHub id
+        referenced by the checkpoint is present in the contributors file.
+
+        Args:
+            head_commit: The hash of the commit the history starts from.
+        """
+        await self.contributors.save_to_file()
+        contributor_commits = {}
+        for contributor, repo_commits in self.repo_commits.items():
+            commits = [
+                commit.to_dict()
+                for commit in repo_commits
+                if self.commit_seq[commit.commit_hash] < self.processed_prefix
+            ]
+            if commits:
+                contributor_commits[contributor.github_id] = commits
+        await save_checkpoint(
+            self.checkpoint_file,
+            {
+                "head_commit": head_commit,
+                "base_commit": self.base_commit,
+                "engine": self.engine,
+                "processed_prefix": self.processed_prefix,
+                "contributor_commits": contributor_commits,
+                "gh_id_lookup_cache": self.gh_id_lookup_cache,
+                "gh_login_lookup_cache": self.gh_login_lookup_cache,
+            },
+        )
+        self.last_checkpoint_time = time.monotonic()
+        logger.info(
+            f"Checkpoint {self.checkpoint_file}: "
+            f"{self.processed_prefix} commits fully processed"
+        )
+
+    async def restore_checkpoint(self, head_commit: str):
+        """Restore the state of the fully processed prefix of git log.
+
+        The checkpoint is only used if it was taken for the same HEAD
+        commit and the same incremental state commit, otherwise the
+        history order differs and the run starts from the first commit.
+
+        Args:
+            head_commit: The hash of the commit the history starts from.
+
+        Raises:
+            ValueError: If the checkpoint refers to an unknown contributor.
+        """
+        state = await load_checkpoint(self.checkpoint_file)
+        if state is None:
+            logger.info(
+                f"No checkpoint {self.checkpoint_file}, "
+                "starting from the first commit"
+            )
+            return
+        if state["head_commit"] != head_commit:
+            logger.warning(
+                f"Checkpoint {self.checkpoint_file} was taken at "
+                f"{state['head_commit']}, HEAD is {head_commit}, "
+                "starting from the first commit"
+            )
+            return
+        if state.get("engine", "numstat") != self.engine:
+            logger.warning(
+                f"Checkpoint {self.checkpoint_file} was taken by the "
+                f"{state.get('engine', 'numstat')} engine, "
+                "starting from the first commit"
+            )
+            return
+        if state.get("base_commit") != self.base_commit:
+            logger.warning(
+                f"Checkpoint {self.checkpoint_file} was taken after "
+                f"{state.get('base_commit')}, the state is at "
+                f"{self.base_commit}, starting from the first commit"
+            )
+            return
+        for github_id, commits in state["contributor_commits"].items():
+            try:
+                contributor = self.contributors.by_github_id[int(github_id)]
+            except KeyError:
+                raise ValueError(
+                    f"Checkpoint contributor with GitHub id {github_id} "
+                    f"is missing in {self.contributors.db_filename}, "
+                    "rerun without resuming"
                 )
-                if need_extra_owners > 0 and contributor_stat:
-                    # Select all contributors to complement to the self.max_owners
-                    # if there is a tie in the number of changes, select all of them
-                    it_contributors = iter(
-                        contributor_stat.most_common(self.max_owners)
-                    )
-                    contributor, previous_contributor_changes = next(
-                        it_contributors
-                    )
-                    folder_settings.owners[contributor.github_login] = (
-                        previous_contributor_changes
-                    )
-                    for contributor, contributor_changes in it_contributors:
-                        if (
-                            len(folder_settings.owners) >= self.max_owners
-                            and contributor_changes
-                            < previous_contributor_changes
-                        ):
-                            # if found enough contributors and the new contributor has less changes, stop
-                            break
-                        folder_settings.owners[contributor.github_login] = (
-                            contributor_changes
-                        )
-                        previous_contributor_changes = contributor_changes
+            for value in commits:
+                commit = GitCommitLocal.from_dict(value)
+                self.commit_seq[commit.commit_hash] = -1
+                contributor.commits.append(commit)
+                self.repo_commits[contributor].append(commit)
+                if (
+                    contributor.last_commit_ts is None
+                    or contributor.last_commit_ts < commit.ts
+                ):
+                    contributor.last_commit_ts = commit.ts
+        self.gh_id_lookup_cache.update(
+            (int(github_id), info)
+            for github_id, info in state["gh_id_lookup_cache"].items()
+        )
+        self.gh_login_lookup_cache.update(state["gh_login_lookup_cache"])
+        self.processed_prefix = self.processed_count = state[
+            "processed_prefix"
+        ]
+        logger.info(
+            f"Resuming from checkpoint {self.checkpoint_file}: "
+            f"skipping {self.processed_prefix} processed commits"
+        )
 
     async def resolve_commit(self):
         """Worker task to resolve commit information and update contributors.
@@ -489,10 +1494,23 @@ class AsyncGitHubRepoSummary:
             if commit is None:
                 # done processing
                 return
-            contributor = self.contributors.by_email.get(commit.email)
-            if not contributor:
-                contributor = await self.build_contributor(commit)
+            async with self.worker_limiter:
+                contributor = self.contributors.by_email.get(commit.email)
+                if contributor:
+                    # Cache hits do not need parallelism, shrink the pool
+                    self.resolve_cache_hits += 1
+                    if self.resolve_cache_hits >= self.worker_limiter.limit:
+                        self.resolve_cache_hits = 0
+                        await self.worker_limiter.cap(
+                            self.worker_limiter.limit - 1, "cache hits"
+                        )
+                else:
+                    # The API lookups benefit from more parallel workers
+                    self.resolve_cache_hits = 0
+                    contributor = await self.build_contributor_once(commit)
+                    await self.worker_limiter.increase("cache misses")
             contributor.commits.append(commit)
+            self.repo_commits[contributor].append(commit)
             if (
                 contributor.last_commit_ts is None
                 or contributor.last_commit_ts < commit.ts
@@ -501,6 +1519,44 @@ class AsyncGitHubRepoSummary:
 
             await self.resolved_commit_queue.put((commit, contributor))
 
+    async def build_contributor_once(
+        self, commit: GitCommitLocal
+    ) -> Contributor:
+        """Build a contributor unless it is already being built.
+
+        Concurrent commits of the same new email, from this or from a shared
+        summarizer, wait for the first lookup instead of repeating it.
+
+        Args:
+            commit: GitCommit instance with local commit info.
+
+        Returns:
+            Contributor: The built contributor instance.
+        """
+        try:
+            return await asyncio.shield(
+                self.pending_contributors[commit.email]
+            )
+        except KeyError:
+            pass
+        pending = asyncio.get_running_loop().create_future()
+        self.pending_contributors[commit.email] = pending
+        try:
+            contributor = await self.build_contributor(commit)
+        except Exception as e:
+            # the waiters, if any, get the same exception
+            pending.set_exception(e)
+            # do not warn about the exception never retrieved
+            pending.exception()
+            raise
+        except BaseException:
+            pending.cancel()
+            raise
+        finally:
+            del self.pending_contributors[commit.email]
+        pending.set_result(contributor)
+        return contributor
+
     async def build_contributor(self, commit: GitCommitLocal) -> Contributor:
         """Build a contributor object from commit information.
 
@@ -514,6 +1570,8 @@ class AsyncGitHubRepoSummary:
         Returns:
             Contributor: The built contributor instance.
         """
+        if self.offline:
+            return await self.build_contributor_offline(commit)
         author_id = await self.github_commit_author_id_lookup(
             commit.commit_hash
         )
@@ -577,3 +1635,107 @@ class AsyncGitHubRepoSummary:
                 except ValueError:
                     pass
         return {}
+
+    def index_contributor(self, contributor: Contributor):
+        """Add a contributor to the offline lookup indexes.
+
+        Names shared by several contributors are ambiguous and map to None.
+
+        Args:
+            contributor: The contributor to index.
+        """
+        if contributor.github_id == -1:
+            return
+        if contributor.github_login:
+            self.by_login[contributor.github_login.lower()] = contributor
+        if contributor.name:
+            name = contributor.name.lower()
+            if self.by_name.get(name, contributor) is not contributor:
+                self.by_name[name] = None
+            else:
+                self.by_name[name] = contributor
+
+    def find_contributor_offline(
+        self, commit: GitCommitLocal
+    ) -> Optional[Contributor]:
+        """Find a known contributor for a commit without calling GitHub.
+
+        The email and name of the commit are already canonical as git
+        applies the repository .mailmap to them. Tries in order: the GitHub
+        id or login from the noreply email, the author name matching a
+        known GitHub login, and the author name matching exactly one known
+        contributor.
+
+        Args:
+            commit: GitCommit instance with local commit info.
+
+        Returns:
+            Optional[Contributor]: The known contributor, or None.
+        """
+        local_part, _, domain = commit.email.rpartition("@")
+        if domain == self.GITHUB_NOREPLY_DOMAIN:
+            id_str, _, github_login = local_part.rpartition("+")
+            try:
+                return self.contributors.by_github_id[int(id_str)]
+            except (KeyError, ValueError):
+                pass
+            try:
+                return self.by_login[github_login.lower()]
+            except KeyError:
+                pass
+        name = commit.name.lower()
+        return self.by_login.get(name) or self.by_name.get(name)
+
+    async def build_contributor_offline(
+        self, commit: GitCommitLocal
+    ) -> Contributor:
+        """Build a contributor object from the local information only.
+
+        The email is added to a known contributor if one is found. A noreply
+        email with an unknown GitHub id produces a new contributor. The
+        remaining emails go to the bundled contributor with GitHub id = -1.
+
+        Args:
+            commit: GitCommit instance with local commit info.
+
+        Returns:
+            Contributor: The built contributor instance.
+        """
+        known_contributor = self.find_contributor_offline(commit)
+        if known_contributor:
+            contributor = Contributor(
+                name=known_contributor.name,
+                emails={commit.email},
+                organization=known_contributor.organization,
+                github_id=known_contributor.github_id,
+                github_login=known_contributor.github_login,
+            )
+            return self.contributors.add_update_contributor(contributor)
+
+        local_part, _, domain = commit.email.rpartition("@")
+        id_str, _, github_login = local_part.rpartition("+")
+        if domain == self.GITHUB_NOREPLY_DOMAIN and id_str.isdigit():
+            contributor = self.contributors.add_update_contributor(
+                Contributor(
+                    name=commit.name,
+                    emails={commit.email},
+                    github_id=int(id_str),
+                    github_login=github_login,
+                )
+            )
+            self.index_contributor(contributor)
+            return contributor
+
+        logger.info(
+            f"Commit {commit.commit_hash}, {commit.name}, "
+            f"{commit.email}, unable to determine authors' GitHub id "
+            "offline. Adding to the bundled contributor with GitHub id = -1"
+        )
+        github_info = await self.github_id_lookup(-1)
+        contributor = Contributor(
+            name=github_info["name"],
+            emails={commit.email},
+            github_id=github_info["id"],
+            github_login=github_info["login"],
+        )
+        return self.contributors.add_update_contributor(contributor)
@@ -1,36 +1,95 @@
 import asyncio
+import bz2
+import gzip
+import itertools
 import logging
+import lzma
+import mmap
 import os
+import sys
+from array import array
 from dataclasses import dataclass
-from typing import Tuple, List
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, List
 import shlex
-from datetime import datetime
-from collections import Counter
+from datetime import datetime, timedelta, tzinfo
+
+from folder_index import FOLDER_INDEX
 
 logger = logging.getLogger(__name__)
 
 COMMIT_HEADER_KEY = "Commit: "
 
 
+# Shared tzinfo objects by the UTC offset, instead of one per commit
+TIMEZONES: Dict[timedelta, tzinfo] = {}
+
+
 @dataclass
 class GitCommitLocal:
     """Represents a Git commit in local file system with metadata and file
     changes.
 
+    The record is compact: the strings are interned and the changes are two
+    parallel integer arrays of the folder ids from FOLDER_INDEX and the
+    change counts.
+
     Attributes:
         name: The author name.
         email: The author email address (lowercase).
         ts: The commit timestamp as a datetime object.
-        changes: A Counter mapping folder paths to change counts.
+        folder_ids: The ids of the changed folders.
+        change_counts: The change counts of the folders in folder_ids.
         commit_hash: The Git commit hash.
     """
 
+    __slots__ = (
+        "name",
+        "email",
+        "ts",
+        "folder_ids",
+        "change_counts",
+        "commit_hash",
+    )
+
     name: str
     email: str
     ts: datetime
-    changes: Counter
+    folder_ids: array
+    change_counts: array
     commit_hash: str
 
+    @classmethod
+    def build_from_changes(
+        cls,
+        name: str,
+        email: str,
+        ts: datetime,
+        changes: Dict[int, int],
+        commit_hash: str,
+    ):
+        """An alternative constructor interning the strings.
+
+        Args:
+            name: The author name.
+            email: The author email address.
+            ts: The commit timestamp.
+            changes: Dictionary mapping the folder ids to change counts.
+            commit_hash: The Git commit hash.
+        """
+        if ts.tzinfo is not None:
+            ts = ts.replace(
+                tzinfo=TIMEZONES.setdefault(ts.utcoffset(), ts.tzinfo)
+            )
+        return cls(
+            sys.intern(name),
+            sys.intern(email.lower()),
+            ts,
+            # built from lists to avoid the array over-allocation
+            array("I", list(changes.keys())),
+            array("I", list(changes.values())),
+            commit_hash,
+        )
+
     @classmethod
     def build_from_git_log(cls, commit_header: str, commit_changes: List[str]):
         """An alternative constructor for  a GitCommit object.
@@ -45,7 +104,6 @@ class GitCommitLocal:
 
         # Split the commit header
         commit_hash, ts_iso_str, email, name = commit_header.split(";", 3)
-        email = email.lower()
         try:
             ts = datetime.fromisoformat(ts_iso_str)
         except ValueError:
@@ -54,7 +112,7 @@ class GitCommitLocal:
             else:
                 raise ValueError(f"Invalid timestamp: {ts_iso_str}")
 
-        changes = Counter()
+        changes = {}
 
         # Group the adds and deletes by the folder
         for line in commit_changes:
@@ -64,8 +122,49 @@ class GitCommitLocal:
             del_count = 1 if del_count_str == "-" else int(del_count_str)
             total_count = add_count + del_count
 
-            changes[os.path.dirname(change_path)] += total_count
-        return cls(name, email, ts, changes, commit_hash)
+            folder_id = FOLDER_INDEX.intern_git_dir(
+                os.path.dirname(change_path)
+            )
+            changes[folder_id] = changes.get(folder_id, 0) + total_count
+        return cls.build_from_changes(name, email, ts, changes, commit_hash)
+
+    @property
+    def changes(self) -> Dict[str, int]:
+        """Dictionary mapping the changed folder paths to change counts."""
+        return {
+            FOLDER_INDEX.paths[folder_id]: change_count
+            for folder_id, change_count in zip(
+                self.folder_ids, self.change_counts
+            )
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a JSON-serializable dictionary representation."""
+        return {
+            "name": self.name,
+            "email": self.email,
+            "ts": self.ts.isoformat(),
+            "changes": self.changes,
+            "commit_hash": self.commit_hash,
+        }
+
+    @classmethod
+    def from_dict(cls, value: Dict[str, Any]):
+        """Build a GitCommitLocal from its dictionary representation.
+
+        Args:
+            value: The dictionary produced by to_dict.
+        """
+        return cls.build_from_changes(
+            value["name"],
+            value["email"],
+            datetime.fromisoformat(value["ts"]),
+            {
+                FOLDER_INDEX.intern(folder): change_count
+                for folder, change_count in value["changes"].items()
+            },
+            value["commit_hash"],
+        )
 
 
 async def get_commit_count(repo_path: str) -> int:
@@ -85,6 +184,48 @@ async def get_commit_count(repo_path: str) -> int:
     return result
 
 
+async def get_head_commit(repo_path: str) -> str:
+    """Get the hash of the commit checked out in a repository.
+
+    Args:
+        repo_path: Path to the Git repository.
+
+    Returns:
+        str: The full hash of the HEAD commit.
+
+    Raises:
+        RuntimeError: If the git command fails to execute.
+    """
+    cmd = f"git -C {shlex.quote(repo_path)} rev-parse HEAD"
+    return (await async_run_cmd(cmd)).strip()
+
+
+async def is_ancestor_commit(
+    repo_path: str, ancestor: str, revision: str = "HEAD"
+) -> bool:
+    """Check if a commit is in the history of a revision.
+
+    Args:
+        repo_path: Path to the Git repository.
+        ancestor: The hash of the possible ancestor commit.
+        revision: The revision whose history is checked.
+
+    Returns:
+        bool: True if the ancestor is reachable from the revision, False if
+        it is not or is unknown, e.g. after a force push.
+    """
+    cmd = (
+        f"git -C {shlex.quote(repo_path)} merge-base --is-ancestor "
+        f"{shlex.quote(ancestor)} {shlex.quote(revision)}"
+    )
+    proc = await asyncio.create_subprocess_shell(
+        cmd,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    return await proc.wait() == 0
+
+
 GIT_URL_END = ".git"
 
 
@@ -165,7 +306,166 @@ async def async_run_cmd_lines(cmd: str):
         raise RuntimeError(msg)
 
 
-async def get_all_commit_stats(repo_path: str):
+class CommitLogParser:
+    """Incremental parser of the "git log --numstat" output.
+
+    Shared by the live git log and the replay of a recorded dump, so both
+    produce identical commits.
+    """
+
+    def __init__(self):
+        """Initialize the parser state."""
+        self.commit_header = None
+        self.commit_changes = []
+
+    def feed(self, line: str) -> Optional[GitCommitLocal]:
+        """Parse one line of the git log output.
+
+        Args:
+            line: The line of the git log output.
+
+        Returns:
+            Optional[GitCommitLocal]: The previous commit once the header of
+            the next one is seen, otherwise None.
+        """
+        line = line.strip()
+        commit = None
+        if line.startswith(COMMIT_HEADER_KEY):
+            if self.commit_header:
+                commit = GitCommitLocal.build_from_git_log(
+                    self.commit_header, self.commit_changes
+                )
+            self.commit_header = line[len(COMMIT_HEADER_KEY) :]
+            self.commit_changes.clear()
+        elif self.commit_header and line:
+            self.commit_changes.append(line)
+        return commit
+
+    def close(self) -> Optional[GitCommitLocal]:
+        """Finish parsing.
+
+        Returns:
+            Optional[GitCommitLocal]: The last commit if it has changes.
+        """
+        if self.commit_changes:
+            return GitCommitLocal.build_from_git_log(
+                self.commit_header, self.commit_changes
+            )
+        return None
+
+
+def parse_commit_log(lines: Iterable[str]) -> Iterator[GitCommitLocal]:
+    """Parse the "git log --numstat" output.
+
+    Args:
+        lines: Lines of the git log output.
+
+    Yields:
+        GitCommitLocal: Commit objects with metadata and change statistics.
+    """
+    parser = CommitLogParser()
+    for line in lines:
+        commit = parser.feed(line)
+        if commit is not None:
+            yield commit
+    commit = parser.close()
+    if commit is not None:
+        yield commit
+
+
+def git_log_cmd(repo_path: str, revision: str = "HEAD", skip: int = 0) -> str:
+    """Build the git log command producing the commit statistics.
+
+    Args:
+        repo_path: Path to the Git repository.
+        revision: The revision to start the history from.
+        skip: The number of the newest commits to skip.
+
+    Returns:
+        str: The shell command.
+    """
+    return (
+        f"git -C {shlex.quote(repo_path)} log "
+        f"--format='{COMMIT_HEADER_KEY}%H;%aI;%aE;%aN' --numstat "
+        f"--skip={int(skip)} {shlex.quote(revision)} --"
+    )
+
+
+# Magic prefixes of the supported compressed log dumps
+LOG_DUMP_COMPRESSION = {
+    b"\x1f\x8b": gzip.open,
+    b"BZh": bz2.open,
+    b"\xfd7zXZ\x00": lzma.open,
+}
+LOG_DUMP_COMPRESSION_BY_SUFFIX = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+}
+
+
+def read_log_dump_lines(filename: str) -> Iterator[str]:
+    """Stream the lines of a recorded git log dump.
+
+    The file is memory-mapped and decompressed on the fly if it starts
+    with a gzip, bzip2 or xz header.
+
+    Args:
+        filename: Path to the recorded dump.
+
+    Yields:
+        str: Lines of the git log output.
+    """
+    with open(filename, "rb") as in_file:
+        if os.fstat(in_file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(
+            in_file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped_file:
+            stream = mapped_file
+            for magic, open_func in LOG_DUMP_COMPRESSION.items():
+                if mapped_file[: len(magic)] == magic:
+                    stream = open_func(mapped_file)
+                    break
+            try:
+                for line in iter(stream.readline, b""):
+                    yield line.decode()
+            finally:
+                if stream is not mapped_file:
+                    stream.close()
+
+
+async def record_commit_log(
+    repo_path: str, filename: str, revision: str = "HEAD"
+):
+    """Record the git log output for a later replay.
+
+    The dump is compressed if the filename ends with .gz, .bz2 or .xz.
+
+    Args:
+        repo_path: Path to the Git repository.
+        filename: Path to the dump to write.
+        revision: The revision to start the history from.
+
+    Raises:
+        RuntimeError: If the git command fails to execute.
+    """
+    open_func = LOG_DUMP_COMPRESSION_BY_SUFFIX.get(
+        os.path.splitext(filename)[1], open
+    )
+    with open_func(filename, "wb") as out_file:
+        async for line in async_run_cmd_lines(
+            git_log_cmd(repo_path, revision)
+        ):
+            out_file.write(line.encode())
+
+
+async def get_all_commit_stats(
+    repo_path: str,
+    revision: str = "HEAD",
+    skip: int = 0,
+    log_dump: Optional[str] = None,
+):
     """Get all commit statistics from a Git repository.
 
     Executes git log to retrieve commit information and file change statistics.
@@ -173,6 +473,11 @@ async def get_all_commit_stats(repo_path: str):
 
     Args:
         repo_path: Path to the Git repository.
+        revision: The revision to start the history from.
+        skip: The number of the newest commits to skip. Git does not
+            compute the stats for the skipped commits.
+        log_dump: Path to a recorded git log dump to replay instead of
+            running git.
 
     Yields:
         GitCommitLocal: Commit objects with metadata and change statistics.
@@ -180,23 +485,20 @@ async def get_all_commit_stats(repo_path: str):
     Raises:
         RuntimeError: If the git command fails to execute.
     """
-    cmd = (
-        f"git -C {shlex.quote(repo_path)} log "
-        f"--format='{COMMIT_HEADER_KEY}%H;%aI;%aE;%aN' --numstat"
-    )
-    commit_header = None
-    commit_changes = []
-    async for line in async_run_cmd_lines(cmd):
-        line = line.strip()
-        if line.startswith(COMMIT_HEADER_KEY):
-            if commit_header:
-                yield GitCommitLocal.build_from_git_log(
-                    commit_header, commit_changes
-                )
-
-            commit_header = line[len(COMMIT_HEADER_KEY) :]
-            commit_changes.clear()
-        elif commit_header and line:
-            commit_changes.append(line)
-    if commit_changes:
-        yield GitCommitLocal.build_from_git_log(commit_header, commit_changes)
+    if log_dump:
+        commits = parse_commit_log(read_log_dump_lines(log_dump))
+        for commit in itertools.islice(commits, skip, None):
+            yield commit
+            # let the workers run between the commits
+            await asyncio.sleep(0)
+        return
+    parser = CommitLogParser()
+    async for line in async_run_cmd_lines(
+        git_log_cmd(repo_path, revision, skip)
+    ):
+        commit = parser.feed(line)
+        if commit is not None:
+            yield commit
+    commit = parser.close()
+    if commit is not None:
+        yield commit
@@ -0,0 +1,280 @@
+"""Module for the ownership statistics of the surviving lines by git blame."""
+
+import asyncio
+import itertools
+import logging
+import os
+import shlex
+import subprocess
+from collections import Counter, defaultdict
+from concurrent.futures import Executor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from async_helpers import GitCommitLocal, async_run_cmd
+from checkpoint import load_json, save_json
+from folder_index import FOLDER_INDEX
+
+logger = logging.getLogger(__name__)
+
+BLAME_CACHE_VERSION = 1
+
+# (name, email, author time, author timezone) of a blamed commit
+CommitAuthor = Tuple[str, str, int, str]
+
+
+def parse_blame_output(
+    output: str,
+) -> Tuple[Dict[str, int], Dict[str, CommitAuthor]]:
+    """Parse the "git blame --incremental" output of a file.
+
+    Args:
+        output: The git blame output.
+
+    Returns:
+        Tuple[Dict[str, int], Dict[str, CommitAuthor]]: The numbers of the
+        surviving lines by commit hash and the authors of the commits.
+    """
+    line_counts = Counter()
+    authors = {}
+    commit_hash = None
+    headers = {}
+    for line in output.splitlines():
+        key, _, value = line.partition(" ")
+        if commit_hash is None:
+            # "<hash> <original line> <final line> <line count>"
+            commit_hash = key
+            line_counts[commit_hash] += int(value.rsplit(" ", 1)[1])
+        elif key == "filename":
+            # The authors are only printed for the first block of a commit
+            if commit_hash not in authors and "author-time" in headers:
+                authors[commit_hash] = (
+                    headers.get("author", ""),
+                    headers.get("author-mail", "").strip("<>"),
+                    int(headers["author-time"]),
+                    headers.get("author-tz", "+0000"),
+                )
+            commit_hash = None
+            headers = {}
+        else:
+            headers[key] = value
+    return dict(line_counts), authors
+
+
+def blame_file(
+    repo_path: str, revision: str, path: str
+) -> Tuple[Dict[str, int], Dict[str, CommitAuthor]]:
+    """Blame a file in a worker process.
+
+    Args:
+        repo_path: Path to the Git repository.
+        revision: The revision to blame.
+        path: The file path relative to the repo root.
+
+    Returns:
+        Tuple[Dict[str, int], Dict[str, CommitAuthor]]: The numbers of the
+        surviving lines by commit hash and the authors of the commits.
+
+    Raises:
+        RuntimeError: If git blame fails.
+    """
+    result = subprocess.run(
+        [
+            "git",
+            "-C",
+            repo_path,
+            "blame",
+            "--incremental",
+            "--porcelain",
+            revision,
+            "--",
+            path,
+        ],
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"Unable to blame {path}. "
+            f"{result.stderr.decode(errors='replace')}, {result.returncode}"
+        )
+    return parse_blame_output(result.stdout.decode(errors="replace"))
+
+
+async def get_tracked_files(repo_path: str, revision: str) -> Dict[str, str]:
+    """Get the blob hashes of the regular files tracked at a revision.
+
+    Args:
+        repo_path: Path to the Git repository.
+        revision: The revision to list.
+
+    Returns:
+        Dict[str, str]: The blob hashes by the file path relative to the
+        repo root. Submodules and symlinks are skipped.
+
+    Raises:
+        RuntimeError: If the git command fails to execute.
+    """
+    cmd = (
+        f"git -C {shlex.quote(repo_path)} ls-tree -r -z --full-tree "
+        f"{shlex.quote(revision)}"
+    )
+    files = {}
+    for entry in (await async_run_cmd(cmd)).split("\0"):
+        if not entry:
+            continue
+        # "<mode> <type> <hash>\t<path>"
+        info, path = entry.split("\t", 1)
+        mode, object_type, blob_hash = info.split(" ")
+        if object_type == "blob" and mode != "120000":
+            files[path] = blob_hash
+    return files
+
+
+def is_ignored(path: str, ignored_folder_ids: Set[int]) -> bool:
+    """Check if a file is in an IGNORE preset folder.
+
+    Args:
+        path: The file path relative to the repo root.
+        ignored_folder_ids: The ids of the IGNORE preset folders.
+
+    Returns:
+        bool: True if the file does not count for any folder.
+    """
+    folder_id = FOLDER_INDEX.intern_git_dir(os.path.dirname(path))
+    return any(
+        ancestor_id in ignored_folder_ids
+        for ancestor_id in FOLDER_INDEX.ancestors(folder_id)
+    )
+
+
+def build_blame_commits(
+    files: Dict[str, Dict[str, Any]], authors: Dict[str, CommitAuthor]
+) -> List[GitCommitLocal]:
+    """Group the surviving lines of the files by the commit and folder.
+
+    Args:
+        files: The cached blame results by file path.
+        authors: The authors by commit hash.
+
+    Returns:
+        List[GitCommitLocal]: One commit per blamed commit with the
+        surviving lines by folder, ordered by the commit hash.
+    """
+    commit_changes = defaultdict(Counter)
+    for path, cached in files.items():
+        folder_id = FOLDER_INDEX.intern_git_dir(os.path.dirname(path))
+        for commit_hash, line_count in cached["lines"].items():
+            commit_changes[commit_hash][folder_id] += line_count
+    commits = []
+    for commit_hash in sorted(commit_changes):
+        name, email, author_time, author_tz = authors[commit_hash]
+        offset = timedelta(
+            hours=int(author_tz[1:3]), minutes=int(author_tz[3:5])
+        )
+        if author_tz[0] == "-":
+            offset = -offset
+        commits.append(
+            GitCommitLocal.build_from_changes(
+                name,
+                email,
+                datetime.fromtimestamp(author_time, timezone(offset)),
+                commit_changes[commit_hash],
+                commit_hash,
+            )
+        )
+    return commits
+
+
+async def get_blame_commit_stats(
+    repo_path: str,
+    revision: str,
+    ignored_folder_ids: Set[int],
+    executor: Executor,
+    cache_file: Optional[str] = None,
+    skip: int = 0,
+):
+    """Get the surviving lines of every commit by git blame.
+
+    The tracked files outside of the IGNORE presets are blamed in the
+    executor processes. The results are cached by the file path and blob
+    hash, so the files unchanged since the previous run are not blamed
+    again.
+
+    Args:
+        repo_path: Path to the Git repository.
+        revision: The revision to blame.
+        ignored_folder_ids: The ids of the IGNORE preset folders.
+        executor: The process pool running git blame.
+        cache_file: Path to the blame cache, not cached if None.
+        skip: The number of the first commits to skip.
+
+    Yields:
+        GitCommitLocal: Commit objects with the surviving lines by folder.
+
+    Raises:
+        RuntimeError: If a git command fails to execute.
+    """
+    cache = None
+    if cache_file:
+        cache = await load_json(cache_file, BLAME_CACHE_VERSION)
+    if cache is None:
+        cache = {"files": {}, "authors": {}}
+    tracked_files = await get_tracked_files(repo_path, revision)
+    files = {}
+    authors = {
+        commit_hash: tuple(author)
+        for commit_hash, author in cache["authors"].items()
+    }
+    to_blame = []
+    for path, blob_hash in tracked_files.items():
+        if is_ignored(path, ignored_folder_ids):
+            continue
+        cached = cache["files"].get(path)
+        if cached is not None and cached["blob"] == blob_hash:
+            files[path] = cached
+        else:
+            to_blame.append(path)
+    logger.info(
+        f"Blaming {len(to_blame)} of {len(to_blame) + len(files)} files, "
+        f"{len(files)} cached"
+    )
+
+    loop = asyncio.get_running_loop()
+
+    async def blame(path: str):
+        return path, await loop.run_in_executor(
+            executor, blame_file, repo_path, revision, path
+        )
+
+    for done_count, blamed in enumerate(
+        asyncio.as_completed([blame(path) for path in to_blame]), 1
+    ):
+        path, (line_counts, file_authors) = await blamed
+        files[path] = {"blob": tracked_files[path], "lines": line_counts}
+        authors.update(file_authors)
+        if done_count % 1000 == 0:
+            logger.info(f"Blamed {done_count} of {len(to_blame)} files")
+
+    if cache_file:
+        used_commits = {
+            commit_hash
+            for cached in files.values()
+            for commit_hash in cached["lines"]
+        }
+        await save_json(
+            cache_file,
+            BLAME_CACHE_VERSION,
+            {
+                "files": files,
+                "authors": {
+                    commit_hash: authors[commit_hash]
+                    for commit_hash in used_commits
+                },
+            },
+        )
+    for commit in itertools.islice(
+        build_blame_commits(files, authors), skip, None
+    ):
+        yield commit
+        # let the workers run between the commits
+        await asyncio.sleep(0)
@@ -0,0 +1,116 @@
+"""Module for persisting the pipeline state between runs."""
+
+import json
+import logging
+from typing import Any, Dict, Optional
+
+import aiofiles
+import aiofiles.os
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 2
+STATE_VERSION = 1
+
+
+async def save_json(filename: str, version: int, state: Dict[str, Any]):
+    """Atomically write a versioned JSON state file.
+
+    The state is written to a temporary file first and then renamed over
+    the file, so an interrupted write never corrupts the previous state.
+
+    Args:
+        filename: Path to the state file.
+        version: The format version stored with the state.
+        state: JSON-serializable state.
+    """
+    contents = json.dumps({"version": version, **state})
+    tmp_filename = f"{filename}.tmp"
+    async with aiofiles.open(tmp_filename, "w") as out_file:
+        await out_file.write(contents)
+        await out_file.flush()
+    await aiofiles.os.replace(tmp_filename, filename)
+
+
+async def load_json(filename: str, version: int) -> Optional[Dict[str, Any]]:
+    """Load a versioned JSON state file.
+
+    Args:
+        filename: Path to the state file.
+        version: The expected format version.
+
+    Returns:
+        Optional[Dict[str, Any]]: The state, or None if there is no file
+        or it was written by an incompatible version.
+    """
+    try:
+        async with aiofiles.open(filename, "r") as in_file:
+            contents = await in_file.read()
+    except FileNotFoundError:
+        return None
+    state = json.loads(contents)
+    if state.get("version") != version:
+        logger.warning(
+            f"Ignoring {filename} of version "
+            f"{state.get('version')}, expected {version}"
+        )
+        return None
+    return state
+
+
+async def save_checkpoint(filename: str, state: Dict[str, Any]):
+    """Atomically write the pipeline state to the checkpoint file.
+
+    Args:
+        filename: Path to the checkpoint file.
+        state: JSON-serializable pipeline state.
+    """
+    await save_json(filename, CHECKPOINT_VERSION, state)
+
+
+async def load_checkpoint(filename: str) -> Optional[Dict[str, Any]]:
+    """Load the pipeline state from the checkpoint file.
+
+    Args:
+        filename: Path to the checkpoint file.
+
+    Returns:
+        Optional[Dict[str, Any]]: The pipeline state, or None if there is
+        no checkpoint or it was written by an incompatible version.
+    """
+    return await load_json(filename, CHECKPOINT_VERSION)
+
+
+async def save_state(filename: str, state: Dict[str, Any]):
+    """Atomically write the ownership state of a completed run.
+
+    Args:
+        filename: Path to the state file.
+        state: JSON-serializable ownership state.
+    """
+    await save_json(filename, STATE_VERSION, state)
+
+
+async def load_state(filename: str) -> Optional[Dict[str, Any]]:
+    """Load the ownership state of the previous completed run.
+
+    Args:
+        filename: Path to the state file.
+
+    Returns:
+        Optional[Dict[str, Any]]: The ownership state, or None if there is
+        no state or it was written by an incompatible version.
+    """
+    return await load_json(filename, STATE_VERSION)
+
+
+async def remove_checkpoint(filename: str):
+    """Remove the checkpoint file after a completed run.
+
+    Args:
+        filename: Path to the checkpoint file.
+    """
+    try:
+        await aiofiles.os.remove(filename)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,207 @@
+"""Module for adaptive (AIMD) concurrency control of the async workers."""
+
+import asyncio
+import logging
+import multiprocessing
+from multiprocessing.context import BaseContext
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def process_pool_context() -> BaseContext:
+    """Get the start method context of the worker process pools.
+
+    The pools are created in a running asyncio process with the aiofiles
+    and executor threads, where forking can deadlock. The workers are
+    started by a fork server, or spawned where it is not available.
+
+    Returns:
+        BaseContext: The context to pass as mp_context.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class AdaptiveLimiter:
+    """An async concurrency limiter with an adjustable limit.
+
+    Behaves like a semaphore whose size is changed at runtime using the
+    additive increase / multiplicative decrease (AIMD) rule: the limit
+    grows by one after a full window of successful operations and is cut
+    by ``decrease_factor`` on congestion (throttling, slow responses or a
+    low remaining quota). A limiter created with ``fixed=True`` never
+    changes its limit, which is used for the explicit CLI overrides.
+
+    Attributes:
+        name: The name of the limiter used in the log messages.
+        limit: The current number of allowed concurrent holders.
+        minimum: The lowest allowed limit.
+        maximum: The highest allowed limit.
+        fixed: True if the limit is not adjusted at runtime.
+        in_flight: The current number of holders.
+        decisions: The number of limit changes made so far.
+    """
+
+    LATENCY_TOLERANCE = 3.0
+    LATENCY_BASELINE_DECAY = 1.01
+    DECREASE_COOLDOWN_SEC = 1.0
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        minimum: int = 1,
+        maximum: int = None,
+        fixed: bool = False,
+        decrease_factor: float = 0.5,
+    ):
+        """Initialize the limiter.
+
+        Args:
+            name: The name of the limiter used in the log messages.
+            initial: The starting limit.
+            minimum: The lowest allowed limit.
+            maximum: The highest allowed limit, unbounded if None.
+            fixed: Do not adjust the limit at runtime.
+            decrease_factor: The multiplier applied on congestion.
+        """
+        if maximum is None:
+            maximum = initial if fixed else max(initial, 1 << 16)
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError(
+                f"Invalid {name} limits: "
+                f"{minimum} <= {initial} <= {maximum} is required"
+            )
+        self.name = name
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.fixed = fixed
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.decisions = 0
+
+        self._condition = None
+        self._successes = 0
+        self._min_latency: Optional[float] = None
+        self._last_decrease = 0.0
+
+    def _get_condition(self) -> asyncio.Condition:
+        """Create the condition lazily inside the running event loop."""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self):
+        """Wait until the number of holders is below the current limit."""
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self):
+        """Release the slot and wake up the waiters."""
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    async def _set_limit(self, new_limit: int, reason: str):
+        """Apply and log the limit change, wake up the waiters.
+
+        Args:
+            new_limit: The requested limit, clamped to the allowed range.
+            reason: The reason of the change for the log.
+        """
+        new_limit = max(self.minimum, min(self.maximum, new_limit))
+        if self.fixed or new_limit == self.limit:
+            return
+        logger.info(
+            f"Concurrency {self.name}: {self.limit} -> {new_limit} "
+            f"({reason}, in flight {self.in_flight})"
+        )
+        self.limit = new_limit
+        self.decisions += 1
+        self._successes = 0
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+
+    async def increase(self, reason: str):
+        """Additively increase the limit after a window of successes.
+
+        Args:
+            reason: The reason of the change for the log.
+        """
+        self._successes += 1
+        if self._successes >= self.limit:
+            await self._set_limit(self.limit + 1, reason)
+
+    async def decrease(self, reason: str):
+        """Multiplicatively decrease the limit.
+
+        Congestion signals arriving within ``DECREASE_COOLDOWN_SEC`` of the
+        previous decrease are caused by the same burst and are ignored.
+
+        Args:
+            reason: The reason of the change for the log.
+        """
+        now = asyncio.get_running_loop().time()
+        if now - self._last_decrease < self.DECREASE_COOLDOWN_SEC:
+            return
+        self._last_decrease = now
+        await self._set_limit(int(self.limit * self.decrease_factor), reason)
+
+    async def cap(self, value: int, reason: str):
+        """Lower the limit to at most the given value.
+
+        Args:
+            value: The upper bound for the limit.
+            reason: The reason of the change for the log.
+        """
+        if value < self.limit:
+            await self._set_limit(value, reason)
+
+    async def record_latency(self, latency: float):
+        """Adjust the limit based on the observed operation latency.
+
+        The baseline is the lowest latency seen so far, slowly decaying up
+        so that a single lucky response does not pin it forever. Latency
+        above ``LATENCY_TOLERANCE`` times the baseline is a congestion
+        signal, otherwise it counts as a success.
+
+        Args:
+            latency: The duration of the operation in seconds.
+        """
+        if self._min_latency is None or latency < self._min_latency:
+            self._min_latency = latency
+        else:
+            self._min_latency *= self.LATENCY_BASELINE_DECAY
+        if latency > self.LATENCY_TOLERANCE * self._min_latency:
+            await self.decrease(
+                f"latency {latency:.2f}s over baseline "
+                f"{self._min_latency:.2f}s"
+            )
+        else:
+            await self.increase("low latency")
+
+    def __repr__(self):
+        """Return a string representation of the limiter.
+
+        Returns:
+            str: String representation of the limiter.
+        """
+        return (
+            f"{__class__.__name__}({repr(self.name)}, limit={self.limit}, "
+            f"range=[{self.minimum}, {self.maximum}], fixed={self.fixed}, "
+            f"decisions={self.decisions})"
+        )
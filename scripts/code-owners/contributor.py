@@ -1,7 +1,9 @@
 """Module for managing contributor information and collections."""
 
+import asyncio
 import logging
 import os
+from collections import Counter
 from typing import Optional, Dict, List, Set
 import yaml
 import aiofiles
@@ -147,6 +149,8 @@ class ContributorCollection:
         self.by_email: Dict[str, Contributor] = dict()
 
         self.db_filename = db_filename
+        # Serializes the saves from the concurrently processed repos
+        self.save_lock = None
 
     def add_update_contributor(
         self, contributor: Contributor
@@ -203,8 +207,11 @@ class ContributorCollection:
             allow_unicode=True,
             default_flow_style=False,
         )
-        async with aiofiles.open(self.db_filename, "w") as out_file:
-            await out_file.write(contents)
+        if self.save_lock is None:
+            self.save_lock = asyncio.Lock()
+        async with self.save_lock:
+            async with aiofiles.open(self.db_filename, "w") as out_file:
+                await out_file.write(contents)
 
     async def load_from_file(self):
         """Load contributors from the YAML file.
@@ -231,6 +238,20 @@ class ContributorCollection:
         except FileNotFoundError:
             pass
 
+    def unresolved_emails(self) -> Dict[str, int]:
+        """Report the emails attributed to the bundled contributor.
+
+        Returns:
+            Dict[str, int]: Commit counts of the emails of the contributor
+            with GitHub id = -1, most frequent first.
+        """
+        bundle = self.by_github_id.get(-1)
+        if bundle is None:
+            return {}
+        return dict(
+            Counter(commit.email for commit in bundle.commits).most_common()
+        )
+
     def __repr__(self):
         """Return a string representation of the ContributorCollection.
 
@@ -0,0 +1,88 @@
+"""Module for the intern table of the repository folder paths."""
+
+import os
+import sys
+from typing import Dict, Iterator, List
+
+
+class FolderIndex:
+    """Intern table mapping the repository folder paths to dense integer ids.
+
+    The folders use the repo_folders format: "/" for the root and "/a/b" for
+    the subfolders. Interning a folder interns all its ancestors as well, so
+    the parent id of every folder is known and the roll-up of the statistics
+    to the ancestors operates on ints only.
+
+    Attributes:
+        ids: Dictionary mapping folder paths to their ids.
+        paths: List of folder paths indexed by id.
+        parents: List of parent folder ids indexed by id, -1 for the root.
+    """
+
+    ROOT_ID = 0
+
+    def __init__(self):
+        """Initialize the table with the root folder."""
+        self.ids: Dict[str, int] = {os.sep: self.ROOT_ID}
+        self.paths: List[str] = [os.sep]
+        self.parents: List[int] = [-1]
+        # Ids by the folder names relative to the repo root, as in git log
+        self.git_dir_ids: Dict[str, int] = {"": self.ROOT_ID}
+
+    def intern(self, folder: str) -> int:
+        """Get the id of a folder, adding it and its ancestors if needed.
+
+        Args:
+            folder: The folder path in the repo_folders format.
+
+        Returns:
+            int: The folder id.
+        """
+        try:
+            return self.ids[folder]
+        except KeyError:
+            pass
+        parent_id = self.intern(os.path.dirname(folder))
+        folder_id = len(self.paths)
+        folder = sys.intern(folder)
+        self.ids[folder] = folder_id
+        self.paths.append(folder)
+        self.parents.append(parent_id)
+        return folder_id
+
+    def intern_git_dir(self, git_dir: str) -> int:
+        """Get the id of a folder relative to the repo root.
+
+        Args:
+            git_dir: The folder name as in git log, "" for the root.
+
+        Returns:
+            int: The folder id.
+        """
+        try:
+            return self.git_dir_ids[git_dir]
+        except KeyError:
+            pass
+        folder_id = self.git_dir_ids[git_dir] = self.intern(os.sep + git_dir)
+        return folder_id
+
+    def ancestors(self, folder_id: int) -> Iterator[int]:
+        """Iterate over the folder and its ancestors up to the root.
+
+        Args:
+            folder_id: The id of the folder to start from.
+
+        Yields:
+            int: The folder ids from the folder up to the root.
+        """
+        while folder_id != -1:
+            yield folder_id
+            folder_id = self.parents[folder_id]
+
+    def __len__(self):
+        """Return the number of interned folders."""
+        return len(self.paths)
+
+
+# The table shared by the commit parser and the repository folders
+FOLDER_INDEX = FolderIndex()
@@ -0,0 +1,326 @@
+"""Module for the sparse folder x contributor matrix export.
+
+The matrix is written as a NumPy .npz archive in the CSR layout without
+depending on NumPy. With NumPy and SciPy it is loaded by
+
+    arrays = numpy.load("ownership.npz")
+    matrix = scipy.sparse.csr_matrix(
+        (arrays["data"], arrays["indices"], arrays["indptr"])
+    )
+
+where the rows are arrays["folders"] and the columns arrays["logins"].
+"""
+
+import ast
+import bisect
+import io
+import struct
+import sys
+import zipfile
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import aiofiles
+import aiofiles.os
+
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+# The .npy header and data alignment
+NPY_ALIGNMENT = 64
+# The array typecodes by the little-endian NumPy dtype
+NPY_TYPECODES = {"<i4": "i", "<i8": "q"}
+
+
+def encode_npy(descr: str, shape: Tuple[int, ...], data: bytes) -> bytes:
+    """Encode an array in the .npy format version 1.0.
+
+    Args:
+        descr: The NumPy dtype, e.g. "<i8".
+        shape: The array shape.
+        data: The array data in the C order.
+
+    Returns:
+        bytes: The .npy file contents.
+    """
+    header = (
+        f"{{'descr': '{descr}', 'fortran_order': False, "
+        f"'shape': {shape!r}, }}"
+    )
+    header_size = len(NPY_MAGIC) + 2 + len(header) + 1
+    header += " " * (-header_size % NPY_ALIGNMENT) + "\n"
+    return NPY_MAGIC + struct.pack("<H", len(header)) + header.encode() + data
+
+
+def decode_npy(contents: bytes) -> Tuple[str, Tuple[int, ...], bytes]:
+    """Decode an array in the .npy format version 1.0.
+
+    Args:
+        contents: The .npy file contents.
+
+    Returns:
+        Tuple[str, Tuple[int, ...], bytes]: The dtype, the shape and the
+        array data.
+
+    Raises:
+        ValueError: If the contents are not a supported .npy array.
+    """
+    if not contents.startswith(NPY_MAGIC):
+        raise ValueError("Not a .npy version 1.0 array")
+    (header_len,) = struct.unpack_from("<H", contents, len(NPY_MAGIC))
+    data_start = len(NPY_MAGIC) + 2 + header_len
+    header = ast.literal_eval(
+        contents[len(NPY_MAGIC) + 2 : data_start].decode()
+    )
+    if header["fortran_order"]:
+        raise ValueError("Fortran order arrays are not supported")
+    return header["descr"], header["shape"], contents[data_start:]
+
+
+def encode_ints(descr: str, values: List[int]) -> bytes:
+    """Encode a list of ints as a .npy array.
+
+    Args:
+        descr: The NumPy dtype, one of NPY_TYPECODES.
+        values: The values.
+
+    Returns:
+        bytes: The .npy file contents.
+    """
+    data = array(NPY_TYPECODES[descr], values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return encode_npy(descr, (len(values),), data.tobytes())
+
+
+def decode_ints(contents: bytes) -> List[int]:
+    """Decode a .npy array of ints.
+
+    Args:
+        contents: The .npy file contents.
+
+    Returns:
+        List[int]: The values.
+
+    Raises:
+        ValueError: If the contents are not a supported .npy array.
+    """
+    descr, _, data = decode_npy(contents)
+    if descr not in NPY_TYPECODES:
+        raise ValueError(f"Unsupported integer dtype {descr}")
+    values = array(NPY_TYPECODES[descr])
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tolist()
+
+
+def encode_strings(values: List[str]) -> bytes:
+    """Encode a list of strings as a fixed width unicode .npy array.
+
+    Args:
+        values: The strings.
+
+    Returns:
+        bytes: The .npy file contents.
+    """
+    width = max((len(value) for value in values), default=0) or 1
+    data = b"".join(
+        value.encode("utf-32-le").ljust(4 * width, b"\0") for value in values
+    )
+    return encode_npy(f"<U{width}", (len(values),), data)
+
+
+def decode_strings(contents: bytes) -> List[str]:
+    """Decode a fixed width unicode .npy array.
+
+    Args:
+        contents: The .npy file contents.
+
+    Returns:
+        List[str]: The strings.
+
+    Raises:
+        ValueError: If the contents are not a supported .npy array.
+    """
+    descr, (length,), data = decode_npy(contents)
+    if not descr.startswith("<U"):
+        raise ValueError(f"Unsupported string dtype {descr}")
+    item_size = 4 * int(descr[2:])
+    return [
+        data[i * item_size : (i + 1) * item_size]
+        .decode("utf-32-le")
+        .rstrip("\0")
+        for i in range(length)
+    ]
+
+
+@dataclass
+class FolderMatrix:
+    """Changes of the contributors by folder in the CSR sparse layout.
+
+    The rows are ordered by the folder path, the columns by the login and
+    the columns of each row by the column, so the queries bisect them.
+
+    Attributes:
+        folders: The folder paths of the rows.
+        logins: The GitHub logins of the columns.
+        github_ids: The GitHub ids of the columns.
+        indptr: The row start offsets into indices and data, one extra
+            offset at the end.
+        indices: The column of each non-zero element, ordered per row.
+        data: The number of changes of each non-zero element.
+    """
+
+    folders: List[str]
+    logins: List[str]
+    github_ids: List[int]
+    indptr: List[int]
+    indices: List[int]
+    data: List[int]
+
+    @classmethod
+    def build(
+        cls,
+        folder_stats: Dict[str, Dict[int, int]],
+        logins: Dict[int, str],
+    ) -> "FolderMatrix":
+        """Build the matrix from the folder statistics.
+
+        Args:
+            folder_stats: The changes by folder path and GitHub id.
+            logins: The GitHub logins by GitHub id.
+
+        Returns:
+            FolderMatrix: The rows ordered by the folder path and the
+            columns by the login.
+        """
+        github_ids = sorted(
+            {
+                github_id
+                for stats in folder_stats.values()
+                for github_id in stats
+            },
+            key=lambda github_id: (logins[github_id], github_id),
+        )
+        columns = {github_id: i for i, github_id in enumerate(github_ids)}
+        folders = sorted(folder_stats)
+        indptr = [0]
+        indices = []
+        data = []
+        for folder in folders:
+            for column, change_count in sorted(
+                (columns[github_id], change_count)
+                for github_id, change_count in folder_stats[folder].items()
+            ):
+                indices.append(column)
+                data.append(change_count)
+            indptr.append(len(indices))
+        return cls(
+            folders,
+            [logins[github_id] for github_id in github_ids],
+            github_ids,
+            indptr,
+            indices,
+            data,
+        )
+
+    def folder_row(self, folder: str) -> Counter:
+        """Get the changes of the contributors in a folder.
+
+        Args:
+            folder: The folder path.
+
+        Returns:
+            Counter: The changes by login, empty for an unknown folder.
+        """
+        row = bisect.bisect_left(self.folders, folder)
+        if row == len(self.folders) or self.folders[row] != folder:
+            return Counter()
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return Counter(
+            {
+                self.logins[column]: change_count
+                for column, change_count in zip(
+                    self.indices[start:end], self.data[start:end]
+                )
+            }
+        )
+
+    def contributor_column(self, login: str) -> Dict[str, int]:
+        """Get the changes of a contributor by folder.
+
+        Args:
+            login: The GitHub login.
+
+        Returns:
+            Dict[str, int]: The changes by folder path, empty for an unknown
+            contributor.
+        """
+        column = bisect.bisect_left(self.logins, login)
+        if column == len(self.logins) or self.logins[column] != login:
+            return {}
+        column_changes = {}
+        for row, folder in enumerate(self.folders):
+            end = self.indptr[row + 1]
+            i = bisect.bisect_left(self.indices, column, self.indptr[row], end)
+            if i < end and self.indices[i] == column:
+                column_changes[folder] = self.data[i]
+        return column_changes
+
+    def to_npz(self) -> bytes:
+        """Encode the matrix as a compressed .npz archive.
+
+        Returns:
+            bytes: The archive contents.
+        """
+        members = {
+            "folders": encode_strings(self.folders),
+            "logins": encode_strings(self.logins),
+            "github_ids": encode_ints("<i8", self.github_ids),
+            "indptr": encode_ints("<i8", self.indptr),
+            "indices": encode_ints("<i4", self.indices),
+            "data": encode_ints("<i8", self.data),
+        }
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, contents in members.items():
+                archive.writestr(f"{name}.npy", contents)
+        return out.getvalue()
+
+    @classmethod
+    def load(cls, filename: str) -> "FolderMatrix":
+        """Load the matrix from a .npz archive.
+
+        Args:
+            filename: Path to the archive.
+
+        Returns:
+            FolderMatrix: The loaded matrix.
+
+        Raises:
+            ValueError: If the archive members are not supported arrays.
+        """
+        with zipfile.ZipFile(filename) as archive:
+            return cls(
+                decode_strings(archive.read("folders.npy")),
+                decode_strings(archive.read("logins.npy")),
+                decode_ints(archive.read("github_ids.npy")),
+                decode_ints(archive.read("indptr.npy")),
+                decode_ints(archive.read("indices.npy")),
+                decode_ints(archive.read("data.npy")),
+            )
+
+
+async def save_folder_matrix(filename: str, matrix: FolderMatrix):
+    """Atomically write the matrix to a .npz archive.
+
+    Args:
+        filename: Path to the archive.
+        matrix: The matrix to write.
+    """
+    tmp_filename = f"{filename}.tmp"
+    async with aiofiles.open(tmp_filename, "wb") as out_file:
+        await out_file.write(matrix.to_npz())
+        await out_file.flush()
+    await aiofiles.os.replace(tmp_filename, filename)
@@ -0,0 +1,212 @@
+"""Module for the sharded roll-up of the contributor changes to the folders."""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from concurrency import process_pool_context
+
+logger = logging.getLogger(__name__)
+
+# Changes of the contributors by GitHub id and folder id
+ContributorChanges = List[Tuple[int, Dict[int, int]]]
+# Partial statistics by folder id and GitHub id
+FolderStats = Dict[int, Dict[int, int]]
+
+# The roll-up tables of a worker process, set by init_roll_up_worker()
+_parents: Sequence[int] = ()
+_ignored_folder_ids: Set[int] = set()
+_counted_folder_ids: Set[int] = set()
+# The counted folders each folder rolls up to, by folder id
+_roll_up_targets: Dict[int, Tuple[int, ...]] = {}
+
+
+def init_roll_up_worker(
+    parents: Sequence[int],
+    ignored_folder_ids: Set[int],
+    counted_folder_ids: Set[int],
+):
+    """Set the folder tables of a worker process.
+
+    Args:
+        parents: The parent folder ids indexed by folder id, -1 for the root.
+        ignored_folder_ids: The ids of the IGNORE preset folders.
+        counted_folder_ids: The ids of the folders whose statistics count.
+    """
+    global _parents, _ignored_folder_ids, _counted_folder_ids
+    _parents = parents
+    _ignored_folder_ids = ignored_folder_ids
+    _counted_folder_ids = counted_folder_ids
+    _roll_up_targets.clear()
+
+
+def roll_up_targets(folder_id: int) -> Tuple[int, ...]:
+    """Get the counted folders the changes of a folder roll up to.
+
+    Args:
+        folder_id: The id of the changed folder.
+
+    Returns:
+        Tuple[int, ...]: The counted folder and ancestor ids below the
+        closest IGNORE preset folder.
+    """
+    try:
+        return _roll_up_targets[folder_id]
+    except KeyError:
+        pass
+    targets = []
+    ancestor_id = folder_id
+    while ancestor_id != -1:
+        if ancestor_id in _ignored_folder_ids:
+            # do not account for the data in the Ignore subfolders
+            break
+        if ancestor_id in _counted_folder_ids:
+            targets.append(ancestor_id)
+        ancestor_id = _parents[ancestor_id]
+    targets = _roll_up_targets[folder_id] = tuple(targets)
+    return targets
+
+
+def roll_up_shard(shard: ContributorChanges) -> FolderStats:
+    """Roll up the changes of a shard of contributors in a worker process.
+
+    Args:
+        shard: The changes of the contributors by GitHub id and folder id.
+
+    Returns:
+        FolderStats: The statistics of the counted folders by GitHub id,
+        the contributors in the shard order.
+    """
+    stats = {}
+    for github_id, folder_changes in shard:
+        for folder_id, change_count in folder_changes.items():
+            for target_id in roll_up_targets(folder_id):
+                folder_stats = stats.get(target_id)
+                if folder_stats is None:
+                    folder_stats = stats[target_id] = {}
+                folder_stats[github_id] = (
+                    folder_stats.get(github_id, 0) + change_count
+                )
+    for folder_stats in stats.values():
+        for github_id in [
+            github_id
+            for github_id, change_count in folder_stats.items()
+            if change_count <= 0
+        ]:
+            del folder_stats[github_id]
+    return stats
+
+
+def merge_folder_stats(left: FolderStats, right: FolderStats) -> FolderStats:
+    """Merge the statistics of two consecutive shards.
+
+    The shards have distinct contributors, the contributors of the left
+    shard stay first.
+
+    Args:
+        left: The statistics of the first shard, updated in place.
+        right: The statistics of the next shard.
+
+    Returns:
+        FolderStats: The merged statistics.
+    """
+    for folder_id, folder_stats in right.items():
+        left_stats = left.get(folder_id)
+        if left_stats is None:
+            left[folder_id] = folder_stats
+        else:
+            left_stats.update(folder_stats)
+    return left
+
+
+def reduce_folder_stats(partials: List[FolderStats]) -> FolderStats:
+    """Merge the shard statistics pairwise until one is left.
+
+    Args:
+        partials: The statistics of the shards in the contributor order.
+
+    Returns:
+        FolderStats: The statistics of all shards.
+    """
+    if not partials:
+        return {}
+    while len(partials) > 1:
+        merged = [
+            merge_folder_stats(partials[i], partials[i + 1])
+            for i in range(0, len(partials) - 1, 2)
+        ]
+        if len(partials) % 2:
+            merged.append(partials[-1])
+        partials = merged
+    return partials[0]
+
+
+def split_shards(
+    contributor_changes: ContributorChanges, shard_count: int
+) -> List[ContributorChanges]:
+    """Split the contributors into consecutive shards of similar size.
+
+    Args:
+        contributor_changes: The changes by GitHub id and folder id.
+        shard_count: The number of shards.
+
+    Returns:
+        List[ContributorChanges]: The non-empty shards in order.
+    """
+    total = sum(len(changes) for _, changes in contributor_changes)
+    shards = []
+    shard = []
+    split_size = 0
+    for github_id, changes in contributor_changes:
+        shard.append((github_id, changes))
+        split_size += len(changes)
+        if split_size * shard_count >= total * (len(shards) + 1):
+            shards.append(shard)
+            shard = []
+    if shard:
+        shards.append(shard)
+    return shards
+
+
+async def roll_up_sharded(
+    contributor_changes: ContributorChanges,
+    parents: Sequence[int],
+    ignored_folder_ids: Set[int],
+    counted_folder_ids: Set[int],
+    workers: Optional[int] = None,
+) -> FolderStats:
+    """Roll up the contributor changes to the folders in worker processes.
+
+    Args:
+        contributor_changes: The changes by GitHub id and folder id.
+        parents: The parent folder ids indexed by folder id, -1 for the root.
+        ignored_folder_ids: The ids of the IGNORE preset folders.
+        counted_folder_ids: The ids of the folders whose statistics count.
+        workers: The number of worker processes, the number of CPUs if None.
+
+    Returns:
+        FolderStats: The statistics of the counted folders by GitHub id,
+        same as rolling up the contributors one by one.
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = split_shards(contributor_changes, workers)
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(shards)) or 1,
+        initializer=init_roll_up_worker,
+        initargs=(list(parents), ignored_folder_ids, counted_folder_ids),
+        mp_context=process_pool_context(),
+    ) as executor:
+        partials = await asyncio.gather(
+            *(
+                loop.run_in_executor(executor, roll_up_shard, shard)
+                for shard in shards
+            )
+        )
+    logger.info(
+        f"Rolled up {len(contributor_changes)} contributors "
+        f"in {len(shards)} shards"
+    )
+    return reduce_folder_stats(list(partials))
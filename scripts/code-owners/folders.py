@@ -13,6 +13,7 @@ import yaml
 from async_helpers import (
     async_run_cmd_lines,
 )
+from folder_index import FOLDER_INDEX
 
 
 class FolderType(Enum):
@@ -110,6 +111,8 @@ async def get_repo_folders(
         folder = folder[len(repo) - 1 :]
         folder_settings = get_folder_settings(folder, preset_folders)
         if folder_settings.folder_type != FolderType.IGNORE:
+            # share the path string and the id with the commit changes
+            folder = FOLDER_INDEX.paths[FOLDER_INDEX.intern(folder)]
             result[folder] = folder_settings
             # update the parent folder with the child name
             if folder != "/":
@@ -0,0 +1,29 @@
+"""Module for the logging setup shared by the command line tools."""
+
+import logging
+import time
+
+LOGGING_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+    "critical": logging.CRITICAL,
+}
+
+
+def setup_logging(log_level: str):
+    """Set up the UTC logging format.
+
+    Args:
+        log_level: The name of the logging level.
+    """
+    logging.Formatter.converter = time.gmtime
+    logging.basicConfig(
+        level=LOGGING_LEVELS[log_level],
+        format=(
+            "%(asctime)s %(levelname)s %(filename)s:%(lineno)d "
+            "Thread:%(thread)d %(message)s"
+        ),
+        datefmt="%Y-%m-%dT%H:%M:%SZ",
+    )
@@ -1,9 +1,13 @@
 import argparse
 import asyncio
+import bisect
+import itertools
 import os
 from datetime import datetime, timezone, date, timedelta
 import logging
 import time
+from typing import Dict, List, Optional, Set, Tuple
+import aiofiles
 import yaml
 
 __version__ = "0.0.5"
@@ -14,31 +18,22 @@ from async_github_repo_summary import (
 from async_helpers import (
     get_remote_owner_repo,
     get_commit_count,
+    record_commit_log,
 )
 from contributor import ContributorCollection
+from folder_matrix import save_folder_matrix
 from folders import load_folder_metadata
+from logging_setup import LOGGING_LEVELS, setup_logging
 
 logger = logging.getLogger(__name__)
 
-LOGGING_LEVELS = {
-    "debug": logging.DEBUG,
-    "info": logging.INFO,
-    "warning": logging.WARNING,
-    "error": logging.ERROR,
-    "critical": logging.CRITICAL,
-}
 
+def add_common_arguments(parser: argparse.ArgumentParser):
+    """Add the arguments shared by the single and the batch mode.
 
-def parse_params() -> argparse.Namespace:
-    """Parse command line arguments.
-
-    Returns:
-        argparse.Namespace: Parsed command line arguments.
+    Args:
+        parser: The parser to add the arguments to.
     """
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "--repo", help="Path to the repo_name to analyze", required=True
-    )
     parser.add_argument(
         "--active_after",
         type=date.fromisoformat,
@@ -54,16 +49,100 @@ def parse_params() -> argparse.Namespace:
         help="YAML file with the contributor information",
         default="contributors.yaml",
     )
-    parser.add_argument(
-        "--folder_presets_file",
-        help="YAML file with the preset folder information",
-    )
     parser.add_argument(
         "--max_owners",
         type=int,
         help="The maximal number of owners per folder",
         default=3,
     )
+    parser.add_argument(
+        "--api_concurrency",
+        type=int,
+        help=(
+            "Fixed number of concurrent GitHub API requests. "
+            "Default: adjusted at runtime"
+        ),
+    )
+    parser.add_argument(
+        "--resolve_workers",
+        type=int,
+        help=(
+            "Fixed number of active commit resolution workers. "
+            "Default: adjusted at runtime"
+        ),
+    )
+    parser.add_argument(
+        "--engine",
+        choices=AsyncGitHubRepoSummary.ENGINES,
+        default="numstat",
+        help=(
+            "Count the changed lines of the whole history (numstat) "
+            "or the surviving lines at HEAD (blame). Default: %(default)s"
+        ),
+    )
+    parser.add_argument(
+        "--blame_workers",
+        type=int,
+        help="Number of git blame processes. Default: the number of CPUs",
+    )
+    parser.add_argument(
+        "--rollup_workers",
+        type=int,
+        help=(
+            "Number of processes rolling up the folder statistics, "
+            "1 to roll up in place. Default: the number of CPUs"
+        ),
+    )
+    parser.add_argument(
+        "--checkpoint_interval",
+        type=float,
+        help="Seconds between the checkpoints. Default: %(default)s",
+        default=300,
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the interrupted run from the checkpoint file",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "Process only the commits after the previous run "
+            "and recompute only the changed folders"
+        ),
+    )
+    parser.add_argument(
+        "--check_incremental",
+        action="store_true",
+        help=(
+            "Recompute an incremental run from scratch "
+            "and fail if the statistics or owners differ"
+        ),
+    )
+    parser.add_argument(
+        "--skip_warm_up",
+        action="store_true",
+        help=(
+            "Do not pre-load the profiles of the repo contributors "
+            "and the organization members from GitHub"
+        ),
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help=(
+            "Do not call GitHub, resolve the unknown emails "
+            "with the local contributor database only"
+        ),
+    )
+    parser.add_argument(
+        "--unresolved_report",
+        help=(
+            "YAML file listing the emails attributed to "
+            "the bundled contributor with GitHub id = -1"
+        ),
+    )
     parser.add_argument(
         "--log_level",
         default="info",  # Default logging level
@@ -74,7 +153,125 @@ def parse_params() -> argparse.Namespace:
             "Default: %(default)s"
         ),
     )
-    return parser.parse_args()
+
+
+def parse_params() -> argparse.Namespace:
+    """Parse command line arguments.
+
+    Returns:
+        argparse.Namespace: Parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--repo", help="Path to the repo_name to analyze", required=True
+    )
+    parser.add_argument(
+        "--folder_presets_file",
+        help="YAML file with the preset folder information",
+    )
+    parser.add_argument(
+        "--checkpoint_file",
+        help=(
+            "File with the pipeline state of an interrupted run. "
+            "Default: <contributors_file>.checkpoint"
+        ),
+    )
+    parser.add_argument(
+        "--state_file",
+        help=(
+            "File with the ownership state for the incremental runs. "
+            "Default: <contributors_file>.state"
+        ),
+    )
+    parser.add_argument(
+        "--blame_cache",
+        help=(
+            "File with the blamed files of the previous runs. "
+            "Default: <contributors_file>.blame"
+        ),
+    )
+    parser.add_argument(
+        "--record_log",
+        help=(
+            "Record the git log of the repo to this file and exit, "
+            "compressed if the name ends with .gz, .bz2 or .xz"
+        ),
+    )
+    parser.add_argument(
+        "--replay_log",
+        help="Read the commits from a recorded git log instead of git",
+    )
+    parser.add_argument(
+        "--matrix_file",
+        help=(
+            "Export the changes of the contributors by folder to this "
+            "sparse matrix .npz file"
+        ),
+    )
+    add_common_arguments(parser)
+    args = parser.parse_args()
+    if args.checkpoint_file is None:
+        args.checkpoint_file = f"{args.contributors_file}.checkpoint"
+    if args.state_file is None:
+        args.state_file = f"{args.contributors_file}.state"
+    if args.blame_cache is None:
+        args.blame_cache = f"{args.contributors_file}.blame"
+    if args.engine == "blame" and args.replay_log:
+        parser.error("--replay_log is not supported by the blame engine")
+    return args
+
+
+def parse_batch_params() -> argparse.Namespace:
+    """Parse command line arguments of the batch mode.
+
+    Returns:
+        argparse.Namespace: Parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--repos",
+        nargs="+",
+        help="Paths to the repos to analyze",
+        required=True,
+    )
+    parser.add_argument(
+        "--output_dir",
+        help=(
+            "Directory for the <repo folder name>.yaml ownership file "
+            "of every repo"
+        ),
+        required=True,
+    )
+    parser.add_argument(
+        "--folder_presets_name",
+        help=(
+            "Path of the folder presets YAML file inside every repo, "
+            "the repos without it have no presets"
+        ),
+    )
+    parser.add_argument(
+        "--export_matrix",
+        action="store_true",
+        help=(
+            "Export the changes of the contributors by folder of every repo "
+            "to the <repo folder name>.yaml.npz sparse matrix file"
+        ),
+    )
+    add_common_arguments(parser)
+    args = parser.parse_args()
+    repos_by_output_file = {}
+    for repo in args.repos:
+        output_file = os.path.join(
+            args.output_dir, f"{os.path.basename(os.path.abspath(repo))}.yaml"
+        )
+        if output_file in repos_by_output_file:
+            parser.error(
+                f"{repos_by_output_file[output_file]} and {repo} have the "
+                f"same output file {output_file}"
+            )
+        repos_by_output_file[output_file] = repo
+    args.output_files = list(repos_by_output_file)
+    return args
 
 
 def main():
@@ -85,21 +282,62 @@ def main():
     """
     main_start_time = time.time()
     args = parse_params()
-    logging.Formatter.converter = time.gmtime
-    logging.basicConfig(
-        level=LOGGING_LEVELS[args.log_level],
-        format=(
-            "%(asctime)s %(levelname)s %(filename)s:%(lineno)d "
-            "Thread:%(thread)d %(message)s"
-        ),
-        datefmt="%Y-%m-%dT%H:%M:%SZ",
-    )
-    asyncio.run(async_loop(args))
+    setup_logging(args.log_level)
+    if args.record_log:
+        asyncio.run(record_commit_log(args.repo, args.record_log))
+    else:
+        asyncio.run(async_loop(args))
+    logger.debug(f"Runtime {time.time() - main_start_time} seconds")
+
+
+def batch_main():
+    """Batch entry point generating the ownership of several repos.
+
+    All repos are processed in one event loop with one contributor
+    collection, one GitHub HTTP session, API concurrency limiter and
+    lookup caches, so every contributor is resolved against GitHub once.
+    """
+    main_start_time = time.time()
+    args = parse_batch_params()
+    setup_logging(args.log_level)
+    asyncio.run(batch_loop(args))
     logger.debug(f"Runtime {time.time() - main_start_time} seconds")
 
 
+def copy_previous_ownership(
+    folder: str, previous_ownership, previous_folders, out_folder_dict
+) -> bool:
+    """Copy the output of an unchanged subtree from the previous run.
+
+    Args:
+        folder: The root of the unchanged subtree.
+        previous_ownership: The output of the previous run.
+        previous_folders: The sorted folders of the previous output.
+        out_folder_dict: The output to copy to.
+
+    Returns:
+        bool: True if the previous run printed the subtree, False if
+        the subtree has to be processed.
+    """
+    prefix = folder + os.sep
+    if prefix not in previous_ownership:
+        return False
+    for print_folder in itertools.islice(
+        previous_folders, bisect.bisect_left(previous_folders, prefix), None
+    ):
+        if not print_folder.startswith(prefix):
+            break
+        out_folder_dict[print_folder] = previous_ownership[print_folder]
+    return True
+
+
 def process_folders_recursively(
-    start_folder: str, repo_folders, out_folder_dict
+    start_folder: str,
+    repo_folders,
+    out_folder_dict,
+    dirty_folders: Optional[Set[str]] = None,
+    previous_ownership=None,
+    previous_folders: Optional[List[str]] = None,
 ):
     """Process the folders with counted contributors top to bottom.
 
@@ -109,6 +347,11 @@ def process_folders_recursively(
     Args:
         start_folder: A folder to start with.
         repo_folders: A collection of folders with children and owners.
+        dirty_folders: The folders whose subtree changed since the previous
+            run, None if all did. The output of the other subtrees is
+            copied from the previous run.
+        previous_ownership: The output of the previous run.
+        previous_folders: The sorted folders of the previous output.
     """
     owners = repo_folders[start_folder].owners
     if owners:
@@ -139,8 +382,24 @@ def process_folders_recursively(
         if not owners_match:
             # proceed to lower levels if there is a mismatched owner there
             for subfolder_full_name in subfolder_full_names:
+                if (
+                    dirty_folders is not None
+                    and subfolder_full_name not in dirty_folders
+                    and copy_previous_ownership(
+                        subfolder_full_name,
+                        previous_ownership,
+                        previous_folders,
+                        out_folder_dict,
+                    )
+                ):
+                    continue
                 process_folders_recursively(
-                    subfolder_full_name, repo_folders, out_folder_dict
+                    subfolder_full_name,
+                    repo_folders,
+                    out_folder_dict,
+                    dirty_folders,
+                    previous_ownership,
+                    previous_folders,
                 )
             # extend the parent ownership to the empty subfolder
             # if any sibling has a different owner
@@ -148,6 +407,119 @@ def process_folders_recursively(
                 out_folder_dict[f"{empty_subfolder}{os.sep}"] = owners.copy()
 
 
+async def get_owner_repo(repo_path: str, offline: bool) -> Tuple[str, str]:
+    """Get the GitHub owner and repository name unless offline.
+
+    Args:
+        repo_path: Path to the Git repository.
+        offline: True in the offline mode.
+
+    Returns:
+        Tuple[str, str]: A tuple containing (owner, repository_name),
+        or (None, None) in the offline mode.
+    """
+    if offline:
+        return None, None
+    return await get_remote_owner_repo(repo_path)
+
+
+async def load_repo_metadata(
+    repo_path: str, folder_presets_file: Optional[str], offline: bool
+):
+    """Load the GitHub name, the folders and the commit count of a repo.
+
+    Args:
+        repo_path: Path to the Git repository.
+        folder_presets_file: YAML file with the preset folder information.
+        offline: True in the offline mode.
+
+    Returns:
+        A tuple of (owner, repository_name), (preset_folders, repo_folders)
+        and the total commit count.
+    """
+    return await asyncio.gather(
+        get_owner_repo(repo_path, offline),
+        load_folder_metadata(folder_presets_file, repo_path),
+        get_commit_count(repo_path),
+    )
+
+
+def collect_ownership(
+    repo_folders, repo_summarizer: AsyncGitHubRepoSummary
+) -> Dict[str, Dict]:
+    """Collect the folder owners to print.
+
+    After an incremental run only the changed subtrees are walked.
+
+    Args:
+        repo_folders: A collection of folders with children and owners.
+        repo_summarizer: The summarizer which processed the repo.
+
+    Returns:
+        Dict[str, Dict]: The owners by the printed folder name.
+    """
+    out_folder_dict = {}
+    dirty_folders = repo_summarizer.dirty_folders
+    if dirty_folders is not None and os.sep not in dirty_folders:
+        return dict(repo_summarizer.previous_ownership)
+    process_folders_recursively(
+        os.sep,
+        repo_folders,
+        out_folder_dict,
+        dirty_folders,
+        repo_summarizer.previous_ownership,
+        sorted(repo_summarizer.previous_ownership),
+    )
+    return out_folder_dict
+
+
+def format_ownership(ownership: Dict[str, Dict]) -> str:
+    """Format the folder owners as the YAML ownership output.
+
+    Args:
+        ownership: The owners by the printed folder name.
+
+    Returns:
+        str: The YAML contents.
+    """
+    return yaml.safe_dump(
+        ownership,
+        indent=2,
+        allow_unicode=True,
+        default_flow_style=False,
+    )
+
+
+async def report_unresolved(
+    contributor_collection: ContributorCollection, args: argparse.Namespace
+):
+    """Log and save the emails which were not resolved to a GitHub user.
+
+    Args:
+        contributor_collection: The contributors after the processing.
+        args: Parsed command line arguments.
+    """
+    unresolved = contributor_collection.unresolved_emails()
+    if unresolved:
+        logger.warning(
+            f"{len(unresolved)} emails with "
+            f"{sum(unresolved.values())} commits are attributed to "
+            "the bundled contributor with GitHub id = -1"
+        )
+        for email, commit_count in unresolved.items():
+            logger.info(f"Unresolved {email}: {commit_count} commits")
+    if args.unresolved_report:
+        contents = yaml.safe_dump(
+            unresolved,
+            indent=2,
+            allow_unicode=True,
+            default_flow_style=False,
+            sort_keys=False,
+        )
+        async with aiofiles.open(args.unresolved_report, "w") as out_file:
+            await out_file.write(contents)
+
+
 async def async_loop(args: argparse.Namespace):
     """Main async processing loop for repository analysis.
 
@@ -155,45 +527,176 @@ async def async_loop(args: argparse.Namespace):
         args: Parsed command line arguments
         containing repository path and settings.
     """
-    repo_summarizer = AsyncGitHubRepoSummary()
+    repo_summarizer = AsyncGitHubRepoSummary(
+        api_concurrency=args.api_concurrency,
+        resolve_workers=args.resolve_workers,
+        checkpoint_file=args.checkpoint_file,
+        checkpoint_interval=args.checkpoint_interval,
+        resume=args.resume,
+        offline=args.offline,
+        log_dump=args.replay_log,
+        state_file=args.state_file if args.incremental else None,
+        warm_up=not args.skip_warm_up,
+        engine=args.engine,
+        blame_cache_file=args.blame_cache,
+        blame_workers=args.blame_workers,
+        rollup_workers=args.rollup_workers,
+        check_incremental=args.check_incremental,
+    )
     contributor_collection = ContributorCollection(args.contributors_file)
 
     (
-        (owner, repo_name),
-        (preset_folders, repo_folders),
+        (
+            (owner, repo_name),
+            (preset_folders, repo_folders),
+            total_commit_count,
+        ),
         _,
-        total_commit_count,
     ) = await asyncio.gather(
-        get_remote_owner_repo(args.repo),
-        load_folder_metadata(args.folder_presets_file, args.repo),
+        load_repo_metadata(args.repo, args.folder_presets_file, args.offline),
         contributor_collection.load_from_file(),
-        get_commit_count(args.repo),
     )
     logging.info("Loaded all folder presets and contributors if any")
 
+    try:
+        await repo_summarizer.process_repository(
+            contributor_collection,
+            preset_folders,
+            repo_folders,
+            args.repo,
+            total_commit_count,
+            owner,
+            repo_name,
+            datetime.combine(
+                args.active_after, datetime.min.time(), timezone.utc
+            ),
+            args.max_owners,
+        )
+    finally:
+        await repo_summarizer.close()
+    logging.info(f"Processed {total_commit_count} commits")
+    await contributor_collection.save_to_file()
+    await report_unresolved(contributor_collection, args)
+
+    ownership = collect_ownership(repo_folders, repo_summarizer)
+    if repo_summarizer.state_file:
+        await repo_summarizer.write_state(ownership)
+    if args.matrix_file:
+        await save_folder_matrix(
+            args.matrix_file, repo_summarizer.build_folder_matrix()
+        )
+    print(format_ownership(ownership))
+
+
+async def batch_repo_loop(
+    repo_summarizer: AsyncGitHubRepoSummary,
+    contributor_collection: ContributorCollection,
+    repo_path: str,
+    folder_presets_name: Optional[str],
+    output_file: str,
+    args: argparse.Namespace,
+) -> Dict[str, Dict]:
+    """Process one repo of the batch and write its ownership file.
+
+    Args:
+        repo_summarizer: The summarizer of this repo.
+        contributor_collection: The contributors shared by all repos.
+        repo_path: Path to the Git repository.
+        folder_presets_name: Path of the folder presets inside the repo.
+        output_file: The ownership YAML file to write.
+        args: Parsed command line arguments.
+
+    Returns:
+        Dict[str, Dict]: The owners by the printed folder name.
+    """
+    folder_presets_file = None
+    if folder_presets_name:
+        folder_presets_file = os.path.join(repo_path, folder_presets_name)
+        if not os.path.isfile(folder_presets_file):
+            logger.info(f"No folder presets {folder_presets_file}")
+            folder_presets_file = None
+    (
+        (owner, repo_name),
+        (preset_folders, repo_folders),
+        total_commit_count,
+    ) = await load_repo_metadata(repo_path, folder_presets_file, args.offline)
     await repo_summarizer.process_repository(
         contributor_collection,
         preset_folders,
         repo_folders,
-        args.repo,
+        repo_path,
         total_commit_count,
         owner,
         repo_name,
         datetime.combine(args.active_after, datetime.min.time(), timezone.utc),
         args.max_owners,
     )
-    logging.info(f"Processed {total_commit_count} commits")
-    await contributor_collection.save_to_file()
-    out_folder_dict = {}
-    process_folders_recursively("/", repo_folders, out_folder_dict)
-    contents = yaml.safe_dump(
-        out_folder_dict,
-        indent=2,
-        allow_unicode=True,
-        default_flow_style=False,
-    )
+    logging.info(f"Processed {total_commit_count} commits of {repo_path}")
+    ownership = collect_ownership(repo_folders, repo_summarizer)
+    async with aiofiles.open(output_file, "w") as out_file:
+        await out_file.write(format_ownership(ownership))
+    if args.export_matrix:
+        await save_folder_matrix(
+            f"{output_file}.npz", repo_summarizer.build_folder_matrix()
+        )
+    return ownership
+
 
-    print(contents)
+async def batch_loop(args: argparse.Namespace):
+    """Async processing loop for the batch of repositories.
+
+    Args:
+        args: Parsed batch command line arguments.
+    """
+    api_summarizer = AsyncGitHubRepoSummary(
+        api_concurrency=args.api_concurrency,
+        offline=args.offline,
+        blame_workers=args.blame_workers,
+    )
+    repo_summarizers = [
+        AsyncGitHubRepoSummary(
+            resolve_workers=args.resolve_workers,
+            checkpoint_file=f"{output_file}.checkpoint",
+            checkpoint_interval=args.checkpoint_interval,
+            resume=args.resume,
+            offline=args.offline,
+            shared=api_summarizer,
+            state_file=f"{output_file}.state" if args.incremental else None,
+            warm_up=not args.skip_warm_up,
+            engine=args.engine,
+            blame_cache_file=f"{output_file}.blame",
+            blame_workers=args.blame_workers,
+            rollup_workers=args.rollup_workers,
+            check_incremental=args.check_incremental,
+        )
+        for output_file in args.output_files
+    ]
+    contributor_collection = ContributorCollection(args.contributors_file)
+    await contributor_collection.load_from_file()
+    os.makedirs(args.output_dir, exist_ok=True)
+    try:
+        ownerships = await asyncio.gather(
+            *(
+                batch_repo_loop(
+                    repo_summarizer,
+                    contributor_collection,
+                    repo_path,
+                    args.folder_presets_name,
+                    output_file,
+                    args,
+                )
+                for repo_summarizer, repo_path, output_file in zip(
+                    repo_summarizers, args.repos, args.output_files
+                )
+            )
+        )
+    finally:
+        await api_summarizer.close()
+    await contributor_collection.save_to_file()
+    await report_unresolved(contributor_collection, args)
+    for repo_summarizer, ownership in zip(repo_summarizers, ownerships):
+        if repo_summarizer.state_file:
+            await repo_summarizer.write_state(ownership)
 
 
 if __name__ == "__main__":
@@ -1,62 +1,282 @@
 """Module for managing organization information and classification."""
 
 import enum
-from typing import Set
-
-
-class ORGANIZATION(enum.Enum):
-    """Enumeration of supported organizations."""
-
-    ANET = "Arista"
-    AVGO = "Broadcom"
-    BABA = "Alibaba Inc"
-    CSCO = "Cisco"
-    DELL = "Dell technologies"
-    HCLTECH = "HCL Technologies Ltd"
-    INTC = "Intel Corporation"
-    JNPR = "Juniper"
-    KEYS = "Keysight Technologies"
-    MRVL = "Marvell Technology Inc"
-    MSFT = "Microsoft"
-    NOK = "Nokia"
-    NVDA = "Nvidia"
-    NXHP = "Nexthop AI"
-    ORANY = "Orange"
-    OTHER = "Other"
-
-
-# A lookup dictionary for domains
-ORGANIZATION_LOOKUP_DOMAIN = {
-    "alibaba.com": ORGANIZATION.BABA,
-    "alibaba-inc.com": ORGANIZATION.BABA,
-    "broadcom.com": ORGANIZATION.AVGO,
-    "dell.com": ORGANIZATION.DELL,
-    "microsoft.com": ORGANIZATION.MSFT,
-    "nvidia.com": ORGANIZATION.NVDA,
-    "mellanox.com": ORGANIZATION.NVDA,
-    "marvell.com": ORGANIZATION.MRVL,
-    "nexthop.ai": ORGANIZATION.NXHP,
-    "orange.com": ORGANIZATION.ORANY,
-    "nokia.com": ORGANIZATION.NOK,
-    "cisco.com": ORGANIZATION.CSCO,
-    "arista.com": ORGANIZATION.ANET,
-    "keysight.com": ORGANIZATION.KEYS,
-    "hcltech.com": ORGANIZATION.HCLTECH,
-    "intel.com": ORGANIZATION.INTC,
-}
+import functools
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Set
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# YAML file with the organization rules extending the default ones
+ORGANIZATION_RULES_ENV_VAR = "CODEOWNERS_ORGANIZATION_RULES"
 
-ORGANIZATION_SUFFIXES = {
-    "arista": ORGANIZATION.ANET,
-    "ms": ORGANIZATION.MSFT,
-    "nv": ORGANIZATION.NVDA,
-    "mlnx": ORGANIZATION.NVDA,
-    "hcl": ORGANIZATION.HCLTECH,
-    "brcm": ORGANIZATION.AVGO,
-    "bcm": ORGANIZATION.AVGO,
-    "nexthop": ORGANIZATION.NXHP,
-    "keys": ORGANIZATION.KEYS,
+# The organizations by the key stored in the contributors file. When several
+# organizations match a company name or a login, the first one wins.
+DEFAULT_ORGANIZATION_RULES: Dict[str, Dict[str, Any]] = {
+    "NVDA": {
+        "name": "Nvidia",
+        "domains": ["nvidia.com", "mellanox.com"],
+        "company_keywords": ["nvidia", "mellanox", "nvda", "mlnx"],
+        "login_suffixes": ["nv", "mlnx"],
+    },
+    "MSFT": {
+        "name": "Microsoft",
+        "domains": ["microsoft.com"],
+        "company_keywords": ["microsoft", "azure", "msft"],
+        "login_suffixes": ["ms"],
+    },
+    "CSCO": {
+        "name": "Cisco",
+        "domains": ["cisco.com"],
+        "company_keywords": ["cisco"],
+    },
+    "ANET": {
+        "name": "Arista",
+        "domains": ["arista.com"],
+        "company_keywords": ["arista"],
+        "login_suffixes": ["arista"],
+    },
+    "KEYS": {
+        "name": "Keysight Technologies",
+        "domains": ["keysight.com"],
+        "company_keywords": ["keysight"],
+        "login_suffixes": ["keys"],
+    },
+    "MRVL": {
+        "name": "Marvell Technology Inc",
+        "domains": ["marvell.com"],
+        "company_keywords": ["marvell"],
+    },
+    "DELL": {
+        "name": "Dell technologies",
+        "domains": ["dell.com"],
+        "company_keywords": ["dell"],
+    },
+    "BABA": {
+        "name": "Alibaba Inc",
+        "domains": ["alibaba.com", "alibaba-inc.com"],
+        "company_keywords": ["alibaba"],
+    },
+    "AVGO": {
+        "name": "Broadcom",
+        "domains": ["broadcom.com"],
+        "company_keywords": ["broadcom"],
+        "login_suffixes": ["brcm", "bcm"],
+    },
+    "NOK": {
+        "name": "Nokia",
+        "domains": ["nokia.com"],
+        "company_keywords": ["nokia"],
+    },
+    "NXHP": {
+        "name": "Nexthop AI",
+        "domains": ["nexthop.ai"],
+        "company_keywords": ["nexthop"],
+        "login_suffixes": ["nexthop"],
+    },
+    "ORANY": {
+        "name": "Orange",
+        "domains": ["orange.com"],
+        "company_keywords": ["orange"],
+    },
+    "JNPR": {
+        "name": "Juniper",
+        "company_keywords": ["juniper"],
+    },
+    "HCLTECH": {
+        "name": "HCL Technologies Ltd",
+        "domains": ["hcltech.com"],
+        "login_suffixes": ["hcl"],
+    },
+    "INTC": {
+        "name": "Intel Corporation",
+        "domains": ["intel.com"],
+    },
 }
 
+# Number of the cached classifier inputs
+CLASSIFIER_CACHE_SIZE = 1 << 16
+
+
+def load_organization_rules(
+    filename: Optional[str],
+) -> Dict[str, Dict[str, Any]]:
+    """Merge the organization rules from a YAML file into the defaults.
+
+    The file has the same structure as DEFAULT_ORGANIZATION_RULES. The
+    lists of a known organization are extended, the new organizations are
+    added after the known ones.
+
+    Args:
+        filename: Path to the YAML rules file, or None for the defaults.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The organization rules by key.
+    """
+    rules = {
+        key: {
+            field: list(value) if isinstance(value, list) else value
+            for field, value in org_rules.items()
+        }
+        for key, org_rules in DEFAULT_ORGANIZATION_RULES.items()
+    }
+    if not filename:
+        return rules
+    with open(filename, "r") as rules_file:
+        loaded_rules = yaml.safe_load(rules_file) or {}
+    for key, org_rules in loaded_rules.items():
+        merged_rules = rules.setdefault(key, {"name": key})
+        for field, value in org_rules.items():
+            if isinstance(value, list):
+                merged_rules.setdefault(field, []).extend(
+                    item for item in value if item not in merged_rules[field]
+                )
+            else:
+                merged_rules[field] = value
+    logger.info(f"Loaded the organization rules from {filename}")
+    return rules
+
+
+ORGANIZATION_RULES = load_organization_rules(
+    os.environ.get(ORGANIZATION_RULES_ENV_VAR)
+)
+
+# Enumeration of supported organizations
+ORGANIZATION = enum.Enum(
+    "ORGANIZATION",
+    [(key, org_rules["name"]) for key, org_rules in ORGANIZATION_RULES.items()]
+    + [("OTHER", "Other")],
+)
+
+
+class OrganizationClassifier:
+    """Organization classifier compiled from the organization rules.
+
+    The positions where a company keyword starts are found by one combined
+    regular expression, the keywords at a position and the login suffixes by
+    one dictionary lookup per distinct keyword or suffix length.
+
+    Attributes:
+        by_domain: Organizations by the lowercase email domain.
+        company_pattern: The combined pattern of all company keywords.
+        by_keyword: Organizations by the lowercase company keyword.
+        keyword_lengths: The distinct keyword lengths.
+        by_suffix: Organizations by the lowercase login suffix.
+        suffix_lengths: The distinct suffix lengths, longest first.
+        priority: The rule order of the organizations, lower wins.
+    """
+
+    def __init__(self, rules: Dict[str, Dict[str, Any]]):
+        """Compile the rules.
+
+        Args:
+            rules: The organization rules by key.
+        """
+        self.by_domain: Dict[str, ORGANIZATION] = {}
+        self.by_keyword: Dict[str, ORGANIZATION] = {}
+        self.by_suffix: Dict[str, ORGANIZATION] = {}
+        self.priority: Dict[ORGANIZATION, int] = {}
+        for key, org_rules in rules.items():
+            org = ORGANIZATION[key]
+            self.priority[org] = len(self.priority)
+            for domain in org_rules.get("domains", []):
+                self.by_domain.setdefault(domain.lower(), org)
+            for keyword in org_rules.get("company_keywords", []):
+                self.by_keyword.setdefault(keyword.lower(), org)
+            for suffix in org_rules.get("login_suffixes", []):
+                self.by_suffix.setdefault(suffix.lower(), org)
+        self.company_pattern = None
+        if self.by_keyword:
+            # the lookahead finds the keywords starting inside a keyword too
+            self.company_pattern = re.compile(
+                "(?=("
+                + "|".join(
+                    re.escape(keyword)
+                    for keyword in sorted(self.by_keyword, key=len)
+                )
+                + "))"
+            )
+        self.keyword_lengths: List[int] = sorted(
+            {len(keyword) for keyword in self.by_keyword}
+        )
+        self.suffix_lengths: List[int] = sorted(
+            {len(suffix) for suffix in self.by_suffix}, reverse=True
+        )
+
+    def best(self, orgs) -> ORGANIZATION:
+        """Select the organization of the earliest rule.
+
+        Args:
+            orgs: The matched organizations.
+
+        Returns:
+            ORGANIZATION: The first organization in the rule order, or OTHER
+            if nothing matched.
+        """
+        return min(
+            orgs, key=self.priority.__getitem__, default=ORGANIZATION.OTHER
+        )
+
+    def by_company(self, company: str) -> ORGANIZATION:
+        """Classify a company name, see organization_by_company()."""
+        if self.company_pattern is None:
+            return ORGANIZATION.OTHER
+        company = company.lower()
+        # the pattern captures one keyword per position, every keyword
+        # starting at the position is looked up, e.g. both "micro" and
+        # "microsoft"
+        orgs = []
+        for match in self.company_pattern.finditer(company):
+            start = match.start()
+            for length in self.keyword_lengths:
+                org = self.by_keyword.get(company[start : start + length])
+                if org is not None:
+                    orgs.append(org)
+        return self.best(orgs)
+
+    def by_login_suffix(self, github_login: str) -> ORGANIZATION:
+        """Classify a GitHub login, see organization_by_suffix()."""
+        orgs = []
+        for length in self.suffix_lengths:
+            if len(github_login) <= length:
+                continue
+            org = self.by_suffix.get(github_login[-length:].lower())
+            if org is None:
+                continue
+            # check if the suffix is separates by the case or punctuation
+            pre_suffix = github_login[-length - 1]
+            suffix_start = github_login[-length]
+            if not pre_suffix.isalnum() or (
+                # case change in between the name and suffix
+                pre_suffix.isalpha()
+                and suffix_start.isalpha()
+                and (pre_suffix.islower() ^ suffix_start.islower())
+            ):
+                orgs.append(org)
+        return self.best(orgs)
+
+
+ORGANIZATION_CLASSIFIER = OrganizationClassifier(ORGANIZATION_RULES)
+
+
+@functools.lru_cache(maxsize=CLASSIFIER_CACHE_SIZE)
+def organization_by_domain(domain: str) -> ORGANIZATION:
+    """Determine organization based on an email domain.
+
+    Args:
+        domain: The email domain.
+
+    Returns:
+        ORGANIZATION: The organization associated with the domain.
+    """
+    return ORGANIZATION_CLASSIFIER.by_domain.get(
+        domain.lower(), ORGANIZATION.OTHER
+    )
+
 
 def organization_by_emails(emails: Set[str]) -> ORGANIZATION:
     """Determine organization based on email domain addresses.
@@ -72,13 +292,13 @@ def organization_by_emails(emails: Set[str]) -> ORGANIZATION:
     """
     for email in emails:
         _, domain = email.split("@")
-        try:
-            return ORGANIZATION_LOOKUP_DOMAIN[domain.lower()]
-        except KeyError:
-            pass
+        org = organization_by_domain(domain)
+        if org != ORGANIZATION.OTHER:
+            return org
     return ORGANIZATION.OTHER
 
 
+@functools.lru_cache(maxsize=CLASSIFIER_CACHE_SIZE)
 def organization_by_company(company: str) -> ORGANIZATION:
     """Determine organization based on company name.
 
@@ -91,42 +311,10 @@ def organization_by_company(company: str) -> ORGANIZATION:
     Returns:
         ORGANIZATION: The organization associated with the company name.
     """
-    company = company.lower()
-    if (
-        "nvidia" in company
-        or "mellanox" in company
-        or "nvda" in company
-        or "mlnx" in company
-    ):
-        return ORGANIZATION.NVDA
-    if "microsoft" in company or "azure" in company or "msft" in company:
-        return ORGANIZATION.MSFT
-    if "cisco" in company:
-        return ORGANIZATION.CSCO
-    if "arista" in company:
-        return ORGANIZATION.ANET
-    if "keysight" in company:
-        return ORGANIZATION.KEYS
-    if "marvell" in company:
-        return ORGANIZATION.MRVL
-    if "dell" in company:
-        return ORGANIZATION.DELL
-    if "alibaba" in company:
-        return ORGANIZATION.BABA
-    if "broadcom" in company:
-        return ORGANIZATION.AVGO
-    if "nokia" in company:
-        return ORGANIZATION.NOK
-    if "nexthop" in company:
-        return ORGANIZATION.NXHP
-    if "orange" in company:
-        return ORGANIZATION.ORANY
-    if "juniper" in company:
-        return ORGANIZATION.JNPR
-
-    return ORGANIZATION.OTHER
+    return ORGANIZATION_CLASSIFIER.by_company(company)
 
 
+@functools.lru_cache(maxsize=CLASSIFIER_CACHE_SIZE)
 def organization_by_suffix(github_login: str) -> ORGANIZATION:
     """Determine organization based on GitHub username suffix.
 
@@ -140,23 +328,4 @@ def organization_by_suffix(github_login: str) -> ORGANIZATION:
     Returns:
         ORGANIZATION: The organization associated with the username suffix.
     """
-    for suffix, org in ORGANIZATION_SUFFIXES.items():
-        # check if the login ends with the suffix
-        if (
-            len(github_login) > len(suffix)
-            and github_login[-len(suffix) :].lower() == suffix
-        ):
-            # check if the suffix is separates by the case or punctuation
-            pre_suffix = github_login[-len(suffix) - 1]
-            if not (pre_suffix.isalnum()):
-                return org
-            suffix_start = github_login[-len(suffix)]
-            # case change in between the name and suffix
-            if (
-                pre_suffix.isalpha()
-                and suffix_start.isalpha()
-                and (pre_suffix.islower() ^ suffix_start.islower())
-            ):
-                return org
-
-    return ORGANIZATION.OTHER
+    return ORGANIZATION_CLASSIFIER.by_login_suffix(github_login)
@@ -0,0 +1,349 @@
+"""Module for the reviewer query service over the codeowners output."""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import yaml
+from aiohttp import web
+
+from logging_setup import LOGGING_LEVELS, setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewerIndex:
+    """The codeowners output kept in memory for the reviewer queries.
+
+    The index file is the YAML output of codeowners-cli mapping the folders
+    to the owners and their weights. It is reloaded when its modification
+    time or size changes.
+
+    Attributes:
+        filename: Path to the index file.
+        folders: The owners by the folder path without the trailing "/".
+        loaded_at: The modification time and size of the loaded file.
+        rejected_at: The modification time and size of the last invalid
+            file, which is not parsed again.
+    """
+
+    def __init__(self, filename: str):
+        """Initialize the index and load the file.
+
+        Args:
+            filename: Path to the index file.
+        """
+        self.filename = filename
+        self.folders: Dict[str, Dict[str, float]] = {}
+        self.loaded_at: Optional[Tuple[int, int]] = None
+        self.rejected_at: Optional[Tuple[int, int]] = None
+        self.reload()
+
+    def load(
+        self,
+    ) -> Optional[Tuple[Tuple[int, int], Dict[str, Dict[str, float]]]]:
+        """Read the index file if it changed since the last load.
+
+        The folders are not modified, so the file can be parsed outside the
+        event loop. A file which fails to parse or is not a mapping of the
+        folders to the owners, for example a partly written one, is skipped.
+
+        Returns:
+            Optional[Tuple[Tuple[int, int], Dict[str, Dict[str, float]]]]:
+            The modification time and size of the file and its folders,
+            None if the file did not change or is invalid.
+        """
+        stat = os.stat(self.filename)
+        loaded_at = (stat.st_mtime_ns, stat.st_size)
+        if loaded_at in (self.loaded_at, self.rejected_at):
+            return None
+        with open(self.filename, "r") as in_file:
+            try:
+                contents = yaml.safe_load(in_file) or {}
+            except yaml.YAMLError as e:
+                logger.error(f"Keeping the previous {self.filename}: {e}")
+                self.rejected_at = loaded_at
+                return None
+        if not isinstance(contents, dict) or not all(
+            isinstance(contributors, dict)
+            for contributors in contents.values()
+        ):
+            logger.error(
+                f"Keeping the previous {self.filename}: not a mapping of "
+                "the folders to the owners"
+            )
+            self.rejected_at = loaded_at
+            return None
+        # clean-up the trailing "/" from the paths
+        folders = {
+            (
+                repo_path.rstrip(os.sep) if repo_path != os.sep else repo_path
+            ): contributors
+            for repo_path, contributors in contents.items()
+        }
+        return loaded_at, folders
+
+    def update(
+        self, loaded: Tuple[Tuple[int, int], Dict[str, Dict[str, float]]]
+    ):
+        """Replace the index with the result of load().
+
+        Args:
+            loaded: The modification time and size of the file and its
+                folders.
+        """
+        self.loaded_at, self.folders = loaded
+        logger.info(f"Loaded {len(self.folders)} folders from {self.filename}")
+
+    def reload(self) -> bool:
+        """Load the index file if it changed since the last load.
+
+        A file which fails to parse keeps the previous index.
+
+        Returns:
+            bool: True if the index was reloaded.
+        """
+        loaded = self.load()
+        if loaded is None:
+            return False
+        self.update(loaded)
+        return True
+
+    def select_reviewers(
+        self,
+        changed_files: Iterable[str],
+        needed_count: int,
+        include_ties: bool,
+    ) -> Tuple[List[str], Counter]:
+        """Select the reviewers of the changed files.
+
+        Same algorithm as workflow_scripts/auto-assign.py: every changed
+        path goes up to the closest folder with owners, then the folders
+        are merged level by level towards the root until enough reviewer
+        candidates are found.
+
+        Args:
+            changed_files: The changed file paths relative to the repo root.
+            needed_count: The number of reviewers to select.
+            include_ties: Also select the candidates tied with the last one.
+
+        Returns:
+            Tuple[List[str], Counter]: The selected reviewers and all
+            candidates with their weights.
+        """
+        seen_folders = set()
+        updated_folders = []
+        reviewer_candidates = Counter()
+        # First bring each changed path to where any reviewer exists
+        for changed_file in changed_files:
+            changed_path = os.path.join(os.sep, os.path.dirname(changed_file))
+            while changed_path not in self.folders:
+                if changed_path in seen_folders:
+                    break
+                seen_folders.add(changed_path)
+                if changed_path == os.sep:
+                    break
+                changed_path = os.path.dirname(changed_path)
+            else:
+                updated_folders.append(changed_path)
+
+        # Merge the most specific folders first
+        updated_folder_queue = deque(sorted(updated_folders, reverse=True))
+        while updated_folder_queue and len(reviewer_candidates) < needed_count:
+            for _ in range(len(updated_folder_queue)):
+                changed_path = updated_folder_queue.popleft()
+                reviewer_candidates += Counter(self.folders[changed_path])
+                # do not try to go above the root
+                if changed_path != os.sep:
+                    changed_path = os.path.dirname(changed_path)
+                    if changed_path not in seen_folders:
+                        seen_folders.add(changed_path)
+                        updated_folder_queue.append(changed_path)
+
+        if not reviewer_candidates:
+            return [], reviewer_candidates
+        if not include_ties:
+            return [
+                reviewer
+                for reviewer, _ in reviewer_candidates.most_common(
+                    needed_count
+                )
+            ], reviewer_candidates
+        reviewers = []
+        # process more carefully to handle the tied contributions
+        it_candidates = iter(reviewer_candidates.most_common())
+        reviewer, previous_change_count = next(it_candidates)
+        reviewers.append(reviewer)
+        for reviewer, change_count in it_candidates:
+            if (
+                len(reviewers) >= needed_count
+                and change_count < previous_change_count
+            ):
+                # stop when enough reviewers found and the tie is broken
+                break
+            reviewers.append(reviewer)
+            previous_change_count = change_count
+        return reviewers, reviewer_candidates
+
+
+async def handle_reviewers(request: web.Request) -> web.Response:
+    """Answer the reviewers of the changed paths.
+
+    The request is a JSON object with "paths" (the changed files), and
+    optional "count" (default 3) and "include_ties" (default false).
+
+    Args:
+        request: The HTTP request.
+
+    Returns:
+        web.Response: JSON with the "reviewers" list and the "candidates"
+        weights, or 400 on an invalid request.
+    """
+    try:
+        query = await request.json()
+        paths = query["paths"]
+        needed_count = int(query.get("count", 3))
+        include_ties = bool(query.get("include_ties", False))
+        if not isinstance(paths, list):
+            raise TypeError("paths must be a list")
+        if not all(isinstance(path, str) for path in paths):
+            raise TypeError("paths must be strings")
+    except (ValueError, KeyError, TypeError) as e:
+        return web.json_response({"error": str(e)}, status=400)
+    start_time = time.perf_counter()
+    reviewers, candidates = request.app["index"].select_reviewers(
+        paths, needed_count, include_ties
+    )
+    logger.debug(
+        f"Selected {reviewers} for {len(paths)} paths in "
+        f"{(time.perf_counter() - start_time) * 1e6:.0f} us"
+    )
+    return web.json_response(
+        {"reviewers": reviewers, "candidates": dict(candidates)}
+    )
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    """Report the loaded index.
+
+    Args:
+        request: The HTTP request.
+
+    Returns:
+        web.Response: JSON with the index file and the number of folders.
+    """
+    index = request.app["index"]
+    return web.json_response(
+        {"index": index.filename, "folders": len(index.folders)}
+    )
+
+
+async def watch_index(index: ReviewerIndex, reload_interval: float):
+    """Reload the index file when it changes.
+
+    The file is parsed in the default executor, so the queries are answered
+    while a large index loads. A failed reload keeps the previous index and
+    the watching goes on.
+
+    Args:
+        index: The index to reload.
+        reload_interval: Seconds between the checks of the file.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(reload_interval)
+        try:
+            loaded = await loop.run_in_executor(None, index.load)
+            if loaded is not None:
+                index.update(loaded)
+        except OSError as e:
+            logger.error(f"Unable to reload {index.filename}: {e}")
+        except Exception:
+            logger.exception(f"Unable to reload {index.filename}")
+
+
+def build_app(index: ReviewerIndex, reload_interval: float) -> web.Application:
+    """Build the service application.
+
+    Args:
+        index: The index to serve.
+        reload_interval: Seconds between the checks of the index file.
+
+    Returns:
+        web.Application: The application with the /reviewers and /health
+        routes.
+    """
+    app = web.Application()
+    app["index"] = index
+
+    async def index_watcher(app: web.Application):
+        watcher = asyncio.create_task(watch_index(index, reload_interval))
+        yield
+        watcher.cancel()
+
+    app.cleanup_ctx.append(index_watcher)
+    app.router.add_post("/reviewers", handle_reviewers)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+def parse_params() -> argparse.Namespace:
+    """Parse command line arguments.
+
+    Returns:
+        argparse.Namespace: Parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--index",
+        help="The codeowners YAML output to serve",
+        required=True,
+    )
+    parser.add_argument(
+        "--host",
+        help="Address to listen on. Default: %(default)s",
+        default="127.0.0.1",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        help="Port to listen on. Default: %(default)s",
+        default=8080,
+    )
+    parser.add_argument(
+        "--unix_socket",
+        help="Listen on this Unix socket instead of the host and port",
+    )
+    parser.add_argument(
+        "--reload_interval",
+        type=float,
+        help="Seconds between the checks of the index file. "
+        "Default: %(default)s",
+        default=1.0,
+    )
+    parser.add_argument(
+        "--log_level",
+        default="info",
+        choices=LOGGING_LEVELS.keys(),
+        help="Set the logging level. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Entry point of the reviewer query service."""
+    args = parse_params()
+    setup_logging(args.log_level)
+    app = build_app(ReviewerIndex(args.index), args.reload_interval)
+    if args.unix_socket:
+        web.run_app(app, path=args.unix_socket, print=None)
+    else:
+        web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
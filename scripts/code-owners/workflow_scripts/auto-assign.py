@@ -1,6 +1,10 @@
 from collections import Counter, deque
+import http.client
+import json
 import os
+import socket
 from shutil import unregister_unpack_format
+from urllib.parse import urlsplit
 import yaml
 
 from github import Auth, Github
@@ -14,70 +18,115 @@ NEEDED_REVIEWER_COUNT = int(os.environ.get("NEEDED_REVIEWER_COUNT", 3))
 INCLUDE_CONTRIBUTORS_TIES = os.environ.get(
     "INCLUDE_CONTRIBUTORS_TIES", "False"
 ).strip().lower() not in ("", "false", "f", "0", "no", "n", "off", "disabled")
+# Optional codeowners-reviewer-service: http://host:port or unix:/path/to/socket
+REVIEWER_SERVICE = os.environ.get("REVIEWER_SERVICE", "").strip()
+REVIEWER_SERVICE_TIMEOUT = float(os.environ.get("REVIEWER_SERVICE_TIMEOUT", 2))
 
-# using an access token
-auth = Auth.Token(GITHUB_TOKEN)
 
-# Public Web Github
-g = Github(auth=auth)
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix socket"""
 
-# Load the reviewer index
-reviewer_index = yaml.safe_load(open(REVIEWER_INDEX))
-# clean-up the trailing "/" from the paths
-reviewer_index = {
-    repo_path.rstrip(os.sep) if repo_path != os.sep else repo_path: contributors
-    for repo_path, contributors in reviewer_index.items()
-}
-# Load the reop and PR information
-repo = g.get_repo(GITHUB_REPOSITORY)
-pr = repo.get_pull(PR_NUMBER)
+    def __init__(self, socket_path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
 
-# Process changed files and directories
-seen_folders = set[str]()
-# Perform the BFS search up to the root of the repository
-# Until the sufficient number of reviewers are found
-updated_folders = []
-reviewer_candidates = Counter[str, int]()
-
-# First bring each changed path to where any reviwer exists
-for changed_file in pr.get_files():
-    # remove the filename, add "/" to the front
-    changed_path = os.path.join(os.sep, os.path.dirname(changed_file.filename))
-    print(f"Processing changed path {changed_path}")
-    while changed_path not in reviewer_index:
-        if changed_path in seen_folders:
-            break
-        seen_folders.add(changed_path)
-        if changed_path == os.sep:
-            break
-        changed_path = os.path.dirname(changed_path)
-        print(f"Going up the path {changed_path}")
-    else:
-        # Found the lowest level contributors
-        # Finished the loop without breaking
-        updated_folders.append(changed_path)
-print(f"Folders with contributors {updated_folders}")
-
-# Populate the the queue with the most specific folders ad the beginning
-updated_folder_queue = deque(sorted(updated_folders, reverse=True))
-
-# Now perform the BFS until the sufficient number of reviewers is found
-while updated_folder_queue and len(reviewer_candidates) < NEEDED_REVIEWER_COUNT:
-    # extract all folder from the current BFS level
-    for _ in range(len(updated_folder_queue)):
-        changed_path = updated_folder_queue.popleft()
-        reviewer_candidates += Counter(reviewer_index[changed_path])
-        print(f"Path: {changed_path}, accumulated reviewers: {reviewer_candidates}")
-        # do not try to go above the root
-        if changed_path != os.sep:
-            changed_path = os.path.dirname(changed_path)
-            if changed_path not in seen_folders:
-                seen_folders.add(changed_path)
-                updated_folder_queue.append(changed_path)
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
 
 
-# Select the top contributors as the reviwers
-if reviewer_candidates:
+def query_reviewer_service(changed_files):
+    """Ask the reviewer service for the reviewers of the changed files"""
+    if REVIEWER_SERVICE.startswith("unix:"):
+        connection = UnixHTTPConnection(
+            REVIEWER_SERVICE[len("unix:"):], REVIEWER_SERVICE_TIMEOUT
+        )
+    else:
+        url = urlsplit(REVIEWER_SERVICE)
+        connection = http.client.HTTPConnection(
+            url.hostname, url.port, timeout=REVIEWER_SERVICE_TIMEOUT
+        )
+    try:
+        connection.request(
+            "POST",
+            "/reviewers",
+            json.dumps(
+                {
+                    "paths": changed_files,
+                    "count": NEEDED_REVIEWER_COUNT,
+                    "include_ties": INCLUDE_CONTRIBUTORS_TIES,
+                }
+            ),
+            {"Content-Type": "application/json"},
+        )
+        response = connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise ValueError(f"HTTP {response.status}: {body[:200]}")
+        result = json.loads(body)
+    finally:
+        connection.close()
+    print(f"Reviewer candidates from {REVIEWER_SERVICE}: {result['candidates']}")
+    return result["reviewers"]
+
+
+def select_reviewers_from_index(changed_files):
+    """Select the reviewers of the changed files from the reviewer index"""
+    # Load the reviewer index
+    reviewer_index = yaml.safe_load(open(REVIEWER_INDEX))
+    # clean-up the trailing "/" from the paths
+    reviewer_index = {
+        repo_path.rstrip(os.sep) if repo_path != os.sep else repo_path: contributors
+        for repo_path, contributors in reviewer_index.items()
+    }
+
+    # Process changed files and directories
+    seen_folders = set[str]()
+    # Perform the BFS search up to the root of the repository
+    # Until the sufficient number of reviewers are found
+    updated_folders = []
+    reviewer_candidates = Counter[str, int]()
+
+    # First bring each changed path to where any reviwer exists
+    for changed_file in changed_files:
+        # remove the filename, add "/" to the front
+        changed_path = os.path.join(os.sep, os.path.dirname(changed_file))
+        print(f"Processing changed path {changed_path}")
+        while changed_path not in reviewer_index:
+            if changed_path in seen_folders:
+                break
+            seen_folders.add(changed_path)
+            if changed_path == os.sep:
+                break
+            changed_path = os.path.dirname(changed_path)
+            print(f"Going up the path {changed_path}")
+        else:
+            # Found the lowest level contributors
+            # Finished the loop without breaking
+            updated_folders.append(changed_path)
+    print(f"Folders with contributors {updated_folders}")
+
+    # Populate the the queue with the most specific folders ad the beginning
+    updated_folder_queue = deque(sorted(updated_folders, reverse=True))
+
+    # Now perform the BFS until the sufficient number of reviewers is found
+    while updated_folder_queue and len(reviewer_candidates) < NEEDED_REVIEWER_COUNT:
+        # extract all folder from the current BFS level
+        for _ in range(len(updated_folder_queue)):
+            changed_path = updated_folder_queue.popleft()
+            reviewer_candidates += Counter(reviewer_index[changed_path])
+            print(f"Path: {changed_path}, accumulated reviewers: {reviewer_candidates}")
+            # do not try to go above the root
+            if changed_path != os.sep:
+                changed_path = os.path.dirname(changed_path)
+                if changed_path not in seen_folders:
+                    seen_folders.add(changed_path)
+                    updated_folder_queue.append(changed_path)
+
+    # Select the top contributors as the reviwers
+    if not reviewer_candidates:
+        return []
     print(f"Reviewer candidates: {reviewer_candidates}")
     if INCLUDE_CONTRIBUTORS_TIES:
         reviewers_to_add = []
@@ -101,7 +150,37 @@ if reviewer_candidates:
             reviewer
             for reviewer, _ in reviewer_candidates.most_common(NEEDED_REVIEWER_COUNT)
         ]
+    return reviewers_to_add
+
+
+# using an access token
+auth = Auth.Token(GITHUB_TOKEN)
 
+# Public Web Github
+g = Github(auth=auth)
+
+# Load the reop and PR information
+repo = g.get_repo(GITHUB_REPOSITORY)
+pr = repo.get_pull(PR_NUMBER)
+changed_files = [changed_file.filename for changed_file in pr.get_files()]
+
+reviewers_to_add = None
+if REVIEWER_SERVICE:
+    try:
+        reviewers_to_add = query_reviewer_service(changed_files)
+    except (
+        OSError,
+        ValueError,
+        KeyError,
+        TypeError,
+        http.client.HTTPException,
+    ) as e:
+        # fall back to the reviewer index in this process
+        print(f"Reviewer service {REVIEWER_SERVICE} failed: {e}")
+if reviewers_to_add is None:
+    reviewers_to_add = select_reviewers_from_index(changed_files)
+
+if reviewers_to_add:
     try:
         # Request reviews
         pr.create_review_request(reviewers=reviewers_to_add)
@@ -113,4 +192,3 @@ if reviewer_candidates:
         print(f"An error occurred: {e}")
 else:
     print("No reviewers found for this PR!")
-